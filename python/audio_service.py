@@ -4,19 +4,30 @@ import logging
 from typing import Dict, Any
 
 class AudioService:
-    def __init__(self):
+    def __init__(self, stream=None):
         self.logger = logging.getLogger(__name__)
         self.progress = 0
+        # Events are written as newline-delimited JSON; the stream defaults to stdout
+        self.stream = stream
+        
+    def emit(self, event: Dict[str, Any]):
+        print(json.dumps(event), file=self.stream or sys.stdout, flush=True)
         
     def update_progress(self, progress: int, status: str):
         self.progress = progress
-        print(json.dumps({
+        self.emit({
             "type": "progress",
             "data": {
                 "progress": progress,
                 "status": status
             }
-        }))
+        })
+        
+    def emit_partial(self, data: Dict[str, Any]):
+        self.emit({
+            "type": "partial",
+            "data": data
+        })
         
     def process(self, file_path: str) -> Dict[str, Any]:
         try:
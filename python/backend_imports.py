@@ -0,0 +1,31 @@
+import importlib
+import logging
+import sys
+import time
+from typing import Dict
+
+# Heavy backends (TensorFlow, pyannote, transformers, torch, scipy,
+# noisereduce, deep_translator) are imported by the stage that needs them, not
+# at startup. Import cost is recorded per backend; a backend that another
+# backend already pulled in (e.g. torch via transformers) shows up with its
+# incremental cost.
+BACKEND_IMPORT_TIMES: Dict[str, float] = {}
+
+
+def import_backend(module_name: str):
+    """Import a heavy backend on first use and record how long the import took"""
+    if module_name in BACKEND_IMPORT_TIMES:
+        return sys.modules[module_name]
+
+    start_time = time.perf_counter()
+    module = importlib.import_module(module_name)
+    BACKEND_IMPORT_TIMES[module_name] = time.perf_counter() - start_time
+    logging.info(f"Imported {module_name} in {BACKEND_IMPORT_TIMES[module_name]:.2f}s")
+    return module
+
+
+def get_import_report() -> Dict[str, float]:
+    """Per-backend import cost in seconds for the backends loaded so far"""
+    report = {name: round(seconds, 3) for name, seconds in BACKEND_IMPORT_TIMES.items()}
+    report["total"] = round(sum(BACKEND_IMPORT_TIMES.values()), 3)
+    return report
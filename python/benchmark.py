@@ -0,0 +1,485 @@
+"""Benchmark the transcription pipeline on synthetic meetings.
+
+Each duration is run in a fresh subprocess (so peak RSS belongs to that run
+alone) against tiny local stand-ins for the Whisper, segmentation and
+speaker models; nothing is downloaded. Results are written as JSON and can
+be compared with a stored baseline:
+
+    python benchmark.py --durations 1m,10m,1h --output results.json
+    python benchmark.py --durations 1m,10m,1h --update-baseline
+    python benchmark.py --durations 1m,10m,1h --baseline ../benchmarks/baseline.json
+
+Absolute numbers only mean something next to a baseline recorded on the
+same machine; the stand-in models are much cheaper than the real ones.
+Speakers are found by diarization, as in production, using the spectral
+embedder; --speaker-model classifier benchmarks the Keras classifier path
+instead.
+
+--accuracy checks the Whisper inference backends instead: it transcribes a
+fixed directory of clips with the real model under each backend and reports
+the word error rate against the fp32 output (and against <clip>.txt
+references where present) plus the speedup:
+
+    python benchmark.py --accuracy ../benchmarks/accuracy --backends int8,onnx
+"""
+import argparse
+import importlib
+import json
+import logging
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import soundfile as sf
+
+SAMPLE_RATE = 16000
+SYNTH_BLOCK_SECONDS = 60.0
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "benchmarks", "baseline.json")
+# Relative slowdown (or memory growth) over the baseline that counts as a regression
+DEFAULT_TOLERANCE = 0.15
+# Stages faster than this are too noisy to compare
+MIN_STAGE_SECONDS = 0.05
+# Largest word error rate against fp32 that a backend may show
+DEFAULT_MAX_WER = 0.05
+ACCURACY_CLIP_EXTENSIONS = (".wav", ".flac", ".mp3", ".m4a", ".ogg")
+SPEAKER_MODELS = ("diarization", "classifier")
+
+
+def parse_duration(text):
+    """'90', '90s', '10m' or '3h' to seconds"""
+    text = text.strip().lower()
+    units = {"s": 1, "m": 60, "h": 3600}
+    if text and text[-1] in units:
+        return float(text[:-1]) * units[text[-1]]
+    return float(text)
+
+
+def plan_turns(duration, num_speakers, rng):
+    """Random speaker turns as (start, end, speaker); about 10% of turns overlap the previous one"""
+    turns = []
+    t = 0.0
+    speaker = 0
+    while t < duration:
+        length = rng.uniform(2.0, 12.0)
+        turns.append((t, min(t + length, duration), speaker))
+        speaker = (speaker + rng.integers(1, num_speakers)) % num_speakers if num_speakers > 1 else 0
+        if rng.random() < 0.1:
+            t += length - rng.uniform(0.5, min(2.0, length))
+        else:
+            t += length + rng.uniform(0.2, 1.5)
+    return turns
+
+
+def render_block(turns, voices, block_start, num_samples, rng):
+    """Sum the voiced turns that fall in one block, plus background noise"""
+    times = block_start + np.arange(num_samples) / SAMPLE_RATE
+    block = rng.normal(0.0, 0.003, num_samples).astype(np.float32)
+    block_end = times[-1]
+
+    for start, end, speaker in turns:
+        if end <= block_start or start > block_end:
+            continue
+        mask = (times >= start) & (times < end)
+        t = times[mask]
+        f0, phase = voices[speaker]
+        # Harmonic "voice" with a ~4 Hz syllable envelope
+        envelope = 0.5 * (1.0 + np.sin(2 * np.pi * 4.0 * t + phase))
+        voice = sum(np.sin(2 * np.pi * f0 * k * t) / k for k in range(1, 6))
+        block[mask] += (0.1 * envelope * voice).astype(np.float32)
+    return block
+
+
+def synthesize_meeting(path, duration, num_speakers=3, seed=0):
+    """Write a synthetic multi-speaker recording block by block; returns its speaker turns"""
+    rng = np.random.default_rng(seed)
+    turns = plan_turns(duration, num_speakers, rng)
+    voices = [(rng.uniform(100.0, 240.0), rng.uniform(0, 2 * np.pi)) for _ in range(num_speakers)]
+
+    total = int(duration * SAMPLE_RATE)
+    block_samples = int(SYNTH_BLOCK_SECONDS * SAMPLE_RATE)
+    with sf.SoundFile(path, "w", samplerate=SAMPLE_RATE, channels=1, subtype="PCM_16") as f:
+        for offset in range(0, total, block_samples):
+            block_start = offset / SAMPLE_RATE
+            # Only turns near this block need rendering
+            nearby = [turn for turn in turns
+                      if turn[1] > block_start and turn[0] < block_start + SYNTH_BLOCK_SECONDS]
+            block = render_block(nearby, voices, block_start, min(block_samples, total - offset), rng)
+            f.write(np.clip(block, -1.0, 1.0))
+    return turns
+
+
+class StandInProcessor:
+    """Whisper feature extraction with a placeholder tokenizer decode"""
+
+    def __init__(self, feature_extractor, eos_token_id):
+        self.feature_extractor = feature_extractor
+        self.eos_token_id = eos_token_id
+
+    def __call__(self, audio, sampling_rate, return_tensors):
+        return self.feature_extractor(audio, sampling_rate=sampling_rate, return_tensors=return_tensors)
+
+    def batch_decode(self, sequences, skip_special_tokens=True):
+        return [" ".join(f"w{token}" for token in row.tolist() if token < self.eos_token_id)
+                for row in sequences]
+
+
+class StandInSegmentation:
+    """Scores shaped like the pyannote segmentation output: [overlap, speech] per frame.
+
+    Speech comes from frame energy; overlap from the synthetic turns, since
+    there is no cheap signal-level proxy for it.
+    """
+
+    def __init__(self, turns, step=0.016875):
+        self.turns = turns
+        self.step = step
+
+    def __call__(self, file):
+        core = importlib.import_module("pyannote.core")
+        audio = file["waveform"].numpy()[0]
+        hop = int(self.step * file["sample_rate"])
+        frames = len(audio) // hop
+        energy = np.sqrt(np.mean(audio[:frames * hop].reshape(frames, hop) ** 2, axis=1) + 1e-12)
+        speech = np.clip((20 * np.log10(energy) + 45.0) / 20.0, 0.0, 1.0)
+
+        active = np.zeros(frames)
+        for start, end, _ in self.turns:
+            active[int(start / self.step):int(end / self.step)] += 1
+        overlap = np.where(active[:frames] >= 2, 0.9, 0.1)
+
+        data = np.stack([overlap, speech], axis=1).astype(np.float32)
+        return core.SlidingWindowFeature(data, core.SlidingWindow(start=0.0, duration=self.step, step=self.step))
+
+
+class StandInSpeakerModel:
+    """Random linear classifier over the FFT features, with a Keras-like predict()"""
+
+    def __init__(self, num_classes, seed=0):
+        self.num_classes = num_classes
+        self.rng = np.random.default_rng(seed)
+        self.weights = None
+
+    def predict(self, features, verbose=0):
+        features = features[:, :, 0]
+        if self.weights is None:
+            self.weights = self.rng.normal(0, 1.0 / features.shape[1], (features.shape[1], self.num_classes))
+        logits = features @ self.weights
+        logits -= logits.max(axis=1, keepdims=True)
+        probabilities = np.exp(logits)
+        return probabilities / probabilities.sum(axis=1, keepdims=True)
+
+
+def build_stand_in_whisper():
+    """Randomly initialised Whisper with the real architecture at a fraction of the size"""
+    torch = importlib.import_module("torch")
+    transformers = importlib.import_module("transformers")
+    torch.manual_seed(0)
+    config = transformers.WhisperConfig(
+        d_model=64, encoder_layers=1, decoder_layers=1,
+        encoder_attention_heads=2, decoder_attention_heads=2,
+        encoder_ffn_dim=128, decoder_ffn_dim=128
+    )
+    model = transformers.WhisperForConditionalGeneration(config)
+    model.eval()
+    processor = StandInProcessor(transformers.WhisperFeatureExtractor(), config.eos_token_id)
+    return processor, model
+
+
+def install_stand_ins(pipeline, turns, num_speakers, work_dir, whisper=None, speaker_model="diarization"):
+    """Swap the stand-in models into a freshly imported process_audio module"""
+    pipeline.processor, pipeline.whisper_model = whisper or build_stand_in_whisper()
+    pipeline.whisper_device = "cpu"
+    # Worker processes would load the real model
+    pipeline.WHISPER_WORKERS = 1
+
+    try:
+        signal = importlib.import_module("pyannote.audio.utils.signal")
+        pipeline.segmentation_inference = StandInSegmentation(turns)
+        pipeline.vad_binarize = signal.Binarize(onset=pipeline.SEGMENTATION_ONSET,
+                                                offset=pipeline.SEGMENTATION_OFFSET, **pipeline.VAD_PARAMS)
+        pipeline.osd_binarize = signal.Binarize(onset=pipeline.SEGMENTATION_ONSET,
+                                                offset=pipeline.SEGMENTATION_OFFSET, **pipeline.OSD_PARAMS)
+    except ImportError:
+        logging.warning("pyannote.audio not installed, benchmarking the fixed-window fallback")
+        pipeline.segmentation_inference = None
+
+    pipeline.class_names = [f"Speaker {i + 1}" for i in range(num_speakers)]
+    if speaker_model == "classifier":
+        pipeline.model_speaker = StandInSpeakerModel(num_speakers)
+    else:
+        diarization = importlib.import_module("diarization")
+        pipeline.model_speaker = None
+        pipeline.speaker_embedder = diarization.SpectralEmbedder()
+        pipeline.SPEAKER_EMBEDDING_MODEL = pipeline.speaker_embedder.name
+        # No reference clips, so nobody is enrolled and no index is built
+        pipeline.audio_path = os.path.join(work_dir, "enrollment")
+        pipeline.speaker_enrollment = None
+    pipeline._models_loaded = True
+
+
+def run_single(duration, num_speakers, seed, speaker_model="diarization"):
+    """Synthesize one recording and run the full transcript path over it"""
+    # Every run must do the full work
+    os.environ["RESULT_CACHE"] = "0"
+    import process_audio
+    from instrumentation import PipelineMetrics
+
+    with tempfile.TemporaryDirectory(prefix="benchmark_") as work_dir:
+        audio_file = os.path.join(work_dir, "meeting.wav")
+        synth_start = time.perf_counter()
+        turns = synthesize_meeting(audio_file, duration, num_speakers, seed)
+        synth_seconds = time.perf_counter() - synth_start
+
+        install_stand_ins(process_audio, turns, num_speakers, work_dir, speaker_model=speaker_model)
+        metrics = PipelineMetrics()
+        lines = process_audio.create_transcript_with_speaker_labels(audio_file, metrics=metrics)
+        metrics.finish()
+
+    summary = metrics.summary()
+    segments = summary["stages"].get("whisper", {}).get("items", 0)
+    return {
+        "duration_seconds": duration,
+        "num_speakers": num_speakers,
+        "speaker_model": speaker_model,
+        "turns": len(turns),
+        "synthesis_seconds": synth_seconds,
+        "segments": segments,
+        "transcript_lines": len(lines),
+        "wall_seconds": summary["wall_seconds"],
+        "cpu_seconds": summary["cpu_seconds"],
+        "real_time_factor": summary["wall_seconds"] / duration,
+        "segments_per_second": segments / summary["wall_seconds"] if summary["wall_seconds"] > 0 else None,
+        # Each run has its own subprocess, so the process high-water mark is this run's peak
+        "peak_rss_bytes": summary["process_peak_rss_bytes"],
+        "stages": summary["stages"]
+    }
+
+
+def run_in_subprocess(duration, num_speakers, seed, speaker_model="diarization"):
+    command = [sys.executable, os.path.abspath(__file__), "--single", str(duration),
+               "--speakers", str(num_speakers), "--seed", str(seed), "--speaker-model", speaker_model]
+    completed = subprocess.run(command, capture_output=True, text=True,
+                               cwd=os.path.dirname(os.path.abspath(__file__)))
+    if completed.returncode != 0:
+        raise RuntimeError(f"Benchmark run for {duration:.0f}s failed:\n{completed.stderr}")
+    # The result is the last line; the pipeline may print before it
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def environment_info():
+    info = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__
+    }
+    for module in ("torch", "transformers", "pyannote.audio"):
+        try:
+            info[module] = importlib.import_module(module).__version__
+        except ImportError:
+            info[module] = None
+    return info
+
+
+def compare_to_baseline(report, baseline, tolerance=DEFAULT_TOLERANCE):
+    """List of human-readable regressions of report against baseline"""
+    regressions = []
+    # Runs recorded before the speaker model was reported used the classifier
+    baseline_runs = {(run["duration_seconds"], run["num_speakers"], run.get("speaker_model", "classifier")): run
+                     for run in baseline["results"]}
+
+    for run in report["results"]:
+        key = (run["duration_seconds"], run["num_speakers"], run.get("speaker_model", "classifier"))
+        reference = baseline_runs.get(key)
+        if reference is None:
+            continue
+        label = f"{run['duration_seconds']:.0f}s/{run['num_speakers']} speakers"
+
+        checks = [("real_time_factor", run["real_time_factor"], reference["real_time_factor"]),
+                  ("peak_rss_bytes", run["peak_rss_bytes"], reference["peak_rss_bytes"])]
+        for name, stage in run["stages"].items():
+            reference_stage = reference["stages"].get(name)
+            if reference_stage and reference_stage["wall_seconds"] >= MIN_STAGE_SECONDS:
+                checks.append((f"{name} wall_seconds", stage["wall_seconds"], reference_stage["wall_seconds"]))
+
+        for name, value, reference_value in checks:
+            if value is None or not reference_value:
+                continue
+            change = value / reference_value - 1.0
+            if change > tolerance:
+                regressions.append(f"{label}: {name} {reference_value:.4g} -> {value:.4g} (+{change:.0%})")
+    return regressions
+
+
+def normalize_words(text):
+    return re.sub(r"[^\w\s']", " ", text.lower()).split()
+
+
+def word_error_rate(reference, hypothesis):
+    """Word-level edit distance divided by the reference length"""
+    reference = normalize_words(reference)
+    hypothesis = normalize_words(hypothesis)
+    if not reference:
+        return 0.0 if not hypothesis else 1.0
+
+    # One row of the Levenshtein table at a time
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_word in enumerate(reference, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hypothesis, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                               previous[j - 1] + (ref_word != hyp_word)))
+        previous = current
+    return previous[-1] / len(reference)
+
+
+def load_test_set(directory):
+    """(name, audio_path, reference_text or None) for each clip, in name order"""
+    clips = []
+    for name in sorted(os.listdir(directory)):
+        stem, extension = os.path.splitext(name)
+        if extension.lower() not in ACCURACY_CLIP_EXTENSIONS:
+            continue
+        reference_path = os.path.join(directory, f"{stem}.txt")
+        reference = None
+        if os.path.exists(reference_path):
+            with open(reference_path, "r", encoding="utf-8") as f:
+                reference = f.read()
+        clips.append((name, os.path.join(directory, name), reference))
+    return clips
+
+
+def transcribe_clips(pipeline, clips, backend):
+    """Transcribe every clip with a freshly loaded backend; returns (texts, seconds)"""
+    pipeline.whisper_model = None
+    pipeline.load_whisper_model(backend)
+
+    window = int(pipeline.WHISPER_WINDOW_SECONDS * pipeline.SAMPLE_RATE)
+    texts = []
+    start = time.perf_counter()
+    for _, path, _ in clips:
+        audio = pipeline.load_audio(path)
+        windows = [pipeline.normalize_volume(audio[offset:offset + window])
+                   for offset in range(0, len(audio), window)]
+        parts = []
+        for offset in range(0, len(windows), pipeline.WHISPER_BATCH_SIZE):
+            parts.extend(pipeline.transcribe_batch(windows[offset:offset + pipeline.WHISPER_BATCH_SIZE]))
+        texts.append(" ".join(parts))
+    return texts, time.perf_counter() - start
+
+
+def run_accuracy(directory, backends):
+    """Compare each backend's transcripts and speed with the fp32 model on a fixed test set"""
+    import process_audio
+
+    clips = load_test_set(directory)
+    if not clips:
+        raise ValueError(f"No audio clips found in {directory}")
+
+    reference_texts, reference_seconds = transcribe_clips(process_audio, clips, "fp32")
+    report = {
+        "model": process_audio.WHISPER_MODEL_NAME,
+        "clips": len(clips),
+        "environment": environment_info(),
+        "backends": {}
+    }
+
+    for backend in ["fp32"] + [backend for backend in backends if backend != "fp32"]:
+        if backend == "fp32":
+            texts, seconds = reference_texts, reference_seconds
+        else:
+            texts, seconds = transcribe_clips(process_audio, clips, backend)
+
+        with_reference = [(reference, text) for (_, _, reference), text in zip(clips, texts) if reference]
+        report["backends"][backend] = {
+            "seconds": seconds,
+            "speedup": reference_seconds / seconds if seconds > 0 else None,
+            "wer_vs_fp32": float(np.mean([word_error_rate(fp32_text, text)
+                                          for fp32_text, text in zip(reference_texts, texts)])),
+            "wer_vs_reference": float(np.mean([word_error_rate(reference, text)
+                                               for reference, text in with_reference]))
+            if with_reference else None,
+            "transcripts": {name: text for (name, _, _), text in zip(clips, texts)}
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--durations", default="1m,10m", help="Comma-separated lengths, e.g. 1m,10m,1h,3h")
+    parser.add_argument("--speakers", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--speaker-model", choices=SPEAKER_MODELS, default="diarization",
+                        help="Speaker labelling path to benchmark")
+    parser.add_argument("--output", help="Write the JSON report here")
+    parser.add_argument("--baseline", help="Compare against this baseline report")
+    parser.add_argument("--update-baseline", nargs="?", const=DEFAULT_BASELINE,
+                        help=f"Store the report as the baseline (default {DEFAULT_BASELINE})")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--accuracy", metavar="DIR", help="Check Whisper backends on the clips in DIR")
+    parser.add_argument("--backends", default="int8,onnx", help="Backends to check against fp32")
+    parser.add_argument("--max-wer", type=float, default=DEFAULT_MAX_WER)
+    parser.add_argument("--single", type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.accuracy:
+        logging.basicConfig(level=logging.WARNING)
+        report = run_accuracy(args.accuracy, args.backends.split(","))
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+        failed = False
+        for backend, result in report["backends"].items():
+            print(f"{backend:>6}  WER vs fp32 {result['wer_vs_fp32']:.3f}  speedup {result['speedup'] or 0:.2f}x",
+                  file=sys.stderr)
+            failed |= result["wer_vs_fp32"] > args.max_wer
+        if failed:
+            print(f"A backend exceeds the maximum WER of {args.max_wer}", file=sys.stderr)
+            sys.exit(1)
+        return
+
+    if args.single is not None:
+        logging.basicConfig(level=logging.WARNING)
+        print(json.dumps(run_single(args.single, args.speakers, args.seed, args.speaker_model)))
+        return
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": environment_info(),
+        "results": []
+    }
+    for duration in (parse_duration(text) for text in args.durations.split(",")):
+        result = run_in_subprocess(duration, args.speakers, args.seed, args.speaker_model)
+        report["results"].append(result)
+        print(f"{duration:>8.0f}s  RTF {result['real_time_factor']:.4f}  "
+              f"{result['segments_per_second'] or 0:.1f} seg/s  "
+              f"peak {(result['peak_rss_bytes'] or 0) / 2 ** 20:.0f} MiB", file=sys.stderr)
+
+    for path in (args.output, args.update_baseline):
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare_to_baseline(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print("No regressions against baseline", file=sys.stderr)
+
+    if not args.output:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+import logging
+import os
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from backend_imports import import_backend
+
+SAMPLE_RATE = 16000
+
+# Segments are embedded in length-sorted batches; only the first
+# EMBEDDING_MAX_SECONDS of a segment is used, which is plenty for a voice print
+EMBEDDING_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", 32))
+EMBEDDING_MAX_SECONDS = 10.0
+EMBEDDING_MIN_SECONDS = 0.1
+
+# Average-linkage clusters are cut at this cosine distance
+CLUSTER_THRESHOLD = float(os.environ.get("SPEAKER_CLUSTER_THRESHOLD", 0.6))
+# Minimum cosine similarity between a cluster and an enrolled voice to use the person's name
+ENROLLMENT_MATCH_THRESHOLD = float(os.environ.get("SPEAKER_MATCH_THRESHOLD", 0.55))
+
+
+def crop_samples(samples: np.ndarray) -> np.ndarray:
+    """First EMBEDDING_MAX_SECONDS of a segment, zero-padded up to EMBEDDING_MIN_SECONDS"""
+    samples = samples[:int(EMBEDDING_MAX_SECONDS * SAMPLE_RATE)]
+    minimum = int(EMBEDDING_MIN_SECONDS * SAMPLE_RATE)
+    if len(samples) < minimum:
+        samples = np.pad(samples, (0, minimum - len(samples)))
+    return samples
+
+
+def l2_normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-10)
+
+
+class EcapaEmbedder:
+    """Batched speaker embeddings from a speechbrain EncoderClassifier (ECAPA-TDNN)."""
+
+    def __init__(self, classifier, torch, name: str, batch_size: int = EMBEDDING_BATCH_SIZE):
+        self.name = name
+        self.classifier = classifier
+        self.torch = torch
+        self.batch_size = batch_size
+
+    def embed(self, samples_list: Sequence[np.ndarray]) -> np.ndarray:
+        samples_list = [crop_samples(samples) for samples in samples_list]
+        embeddings = [None] * len(samples_list)
+
+        # Similar lengths share a batch so little of each batch is padding
+        order = sorted(range(len(samples_list)), key=lambda index: len(samples_list[index]))
+        for batch_start in range(0, len(order), self.batch_size):
+            batch = order[batch_start:batch_start + self.batch_size]
+            longest = max(len(samples_list[index]) for index in batch)
+            waveforms = np.zeros((len(batch), longest), dtype=np.float32)
+            for row, index in enumerate(batch):
+                waveforms[row, :len(samples_list[index])] = samples_list[index]
+            lengths = np.array([len(samples_list[index]) / longest for index in batch], dtype=np.float32)
+
+            with self.torch.no_grad():
+                output = self.classifier.encode_batch(self.torch.from_numpy(waveforms),
+                                                      self.torch.from_numpy(lengths))
+            output = output.squeeze(1).cpu().numpy()
+            for row, index in enumerate(batch):
+                embeddings[index] = output[row]
+
+        if not embeddings:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack(embeddings).astype(np.float32)
+
+
+class SpectralEmbedder:
+    """Fallback voice print when speechbrain is unavailable: mean and spread of log band energies.
+
+    Much weaker than a trained embedding, but enough to separate clearly
+    different voices.
+    """
+
+    def __init__(self, bands: int = 40, frame_seconds: float = 0.025, hop_seconds: float = 0.010):
+        self.name = f"spectral-{bands}"
+        self.bands = bands
+        self.frame = int(frame_seconds * SAMPLE_RATE)
+        self.hop = int(hop_seconds * SAMPLE_RATE)
+        self.window = np.hanning(self.frame).astype(np.float32)
+
+    def embed(self, samples_list: Sequence[np.ndarray]) -> np.ndarray:
+        embeddings = np.zeros((len(samples_list), 2 * self.bands), dtype=np.float32)
+        for row, samples in enumerate(samples_list):
+            samples = crop_samples(np.asarray(samples, dtype=np.float32))
+            if len(samples) < self.frame:
+                samples = np.pad(samples, (0, self.frame - len(samples)))
+            frames = np.lib.stride_tricks.sliding_window_view(samples, self.frame)[::self.hop] * self.window
+            power = np.abs(np.fft.rfft(frames, axis=1)) ** 2
+            # Pool the spectrum into equal-width bands, skipping the DC bin
+            usable = (power.shape[1] - 1) // self.bands * self.bands
+            band_energy = np.log(power[:, 1:usable + 1].reshape(len(frames), self.bands, -1).sum(axis=2) + 1e-10)
+            # Remove the per-segment level so loudness doesn't separate clusters
+            band_energy -= band_energy.mean()
+            embeddings[row, :self.bands] = band_energy.mean(axis=0)
+            embeddings[row, self.bands:] = band_energy.std(axis=0)
+        return embeddings
+
+
+def cluster_embeddings(embeddings: np.ndarray, threshold: float = CLUSTER_THRESHOLD,
+                       num_speakers: Optional[int] = None) -> np.ndarray:
+    """Agglomerative (average-linkage, cosine) cluster labels, numbered by first appearance"""
+    if len(embeddings) == 0:
+        return np.zeros(0, dtype=int)
+    if len(embeddings) == 1:
+        return np.zeros(1, dtype=int)
+
+    # scipy costs noticeable import time, so it is only loaded once there is something to cluster
+    hierarchy = import_backend("scipy.cluster.hierarchy")
+    linkage = hierarchy.linkage(l2_normalize(embeddings), method="average", metric="cosine")
+    if num_speakers:
+        labels = hierarchy.fcluster(linkage, t=num_speakers, criterion="maxclust")
+    else:
+        labels = hierarchy.fcluster(linkage, t=threshold, criterion="distance")
+
+    # Renumber so the first speaker to talk is cluster 0
+    _, first_index, inverse = np.unique(labels, return_index=True, return_inverse=True)
+    rank = np.argsort(np.argsort(first_index))
+    return rank[inverse]
+
+
+def cluster_centroids(embeddings: np.ndarray, labels: np.ndarray) -> np.ndarray:
+    """Normalized mean embedding of each cluster"""
+    centroids = np.zeros((labels.max() + 1, embeddings.shape[1]), dtype=np.float32)
+    np.add.at(centroids, labels, l2_normalize(embeddings))
+    return l2_normalize(centroids)
+
+
+def match_clusters(centroids: np.ndarray, index,
+                   threshold: float = ENROLLMENT_MATCH_THRESHOLD) -> List[Optional[str]]:
+    """Enrolled name for each cluster centroid, or None; each person is given to at most one cluster
+
+    index is a speaker_index.SpeakerIndex.
+    """
+    names = [None] * len(centroids)
+    if len(index) == 0 or len(centroids) == 0:
+        return names
+
+    similarity = index.person_scores(centroids)
+    # Greedy assignment, best pairs first
+    taken = set()
+    for flat_index in np.argsort(similarity, axis=None)[::-1]:
+        cluster, person = np.unravel_index(flat_index, similarity.shape)
+        if similarity[cluster, person] < threshold:
+            break
+        if names[cluster] is None and person not in taken:
+            names[cluster] = index.names[person]
+            taken.add(person)
+    return names
+
+
+def assign_speakers(embeddings: np.ndarray, index=None,
+                    threshold: float = CLUSTER_THRESHOLD) -> List[Tuple[str, float]]:
+    """(label, confidence) per segment from its embedding.
+
+    Clusters matched to a voice in the enrollment index take that person's name, the rest
+    are labelled "Speaker 1", "Speaker 2", ... in order of appearance. The
+    confidence is the cosine similarity between a segment and its cluster.
+    """
+    if len(embeddings) == 0:
+        return []
+
+    labels = cluster_embeddings(embeddings, threshold)
+    centroids = cluster_centroids(embeddings, labels)
+    confidence = np.einsum("ij,ij->i", l2_normalize(embeddings), centroids[labels])
+
+    matched = match_clusters(centroids, index) if index is not None else [None] * len(centroids)
+    names = []
+    anonymous = 0
+    for name in matched:
+        if name is None:
+            anonymous += 1
+            name = f"Speaker {anonymous}"
+        names.append(name)
+
+    logging.info(f"Diarization found {len(centroids)} speakers, {sum(name is not None for name in matched)} enrolled")
+    return [(names[label], float(score)) for label, score in zip(labels, confidence)]
+
@@ -1,12 +1,16 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Request, Response, request, jsonify
 from flask_cors import CORS
 import os
 import logging
 import traceback
 from werkzeug.utils import secure_filename
 import json
+import hashlib
+import threading
+import uuid
 
-# Set up logging
+# Set up logging before importing the pipeline, whose import-time
+# basicConfig would otherwise claim the root logger first
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s',
@@ -14,6 +18,11 @@ logging.basicConfig(
     filemode='a'
 )
 
+import process_audio as audio_pipeline
+from instrumentation import REGISTRY
+from job_queue import DONE, FAILED, JobQueue, JobStore, QueueFullError
+from transcript_index import find_segment
+
 app = Flask(__name__)
 CORS(app)
 
@@ -26,60 +35,272 @@ app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 TRANSCRIPT_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'transcripts')
 os.makedirs(TRANSCRIPT_FOLDER, exist_ok=True)
 
+# Asynchronous jobs: a bounded worker pool processes uploads in the background
+# and job state is kept in SQLite so queued jobs survive restarts
+JOB_STORE_PATH = os.environ.get(
+    "JOB_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cache', 'jobs.sqlite3')
+)
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 1))
+JOB_QUEUE_SIZE = int(os.environ.get("JOB_QUEUE_SIZE", 8))
+
+def run_job(file_path, audio_hash=None):
+    return audio_pipeline.process_file(file_path, transcript_dir=TRANSCRIPT_FOLDER, audio_hash=audio_hash)
+
+job_queue = JobQueue(JobStore(JOB_STORE_PATH), run_job, max_workers=JOB_WORKERS, max_pending=JOB_QUEUE_SIZE)
+
+def warm_up_models():
+    """Load the transcription models once so requests don't pay the cold start."""
+    try:
+        audio_pipeline.load_models()
+    except Exception as e:
+        logging.error(f"Error warming up models: {str(e)}")
+        logging.error(traceback.format_exc())
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint."""
-    return jsonify({"status": "healthy"})
+    return jsonify({
+        "status": "healthy",
+        "models_loaded": audio_pipeline.models_loaded(),
+        "backend_import_seconds": audio_pipeline.get_import_report(),
+        "pending_jobs": job_queue.pending()
+    })
 
-@app.route('/process-audio', methods=['POST'])
-def process_audio():
-    """Process uploaded audio file and return transcript."""
-    try:
-        # Check if file is in request
-        if 'file' not in request.files:
-            return jsonify({"status": "error", "error": "No file part"}), 400
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Pipeline stage timings and throughput in the Prometheus text format."""
+    return Response(
+        REGISTRY.render({
+            "pending_jobs": job_queue.pending(),
+            "models_loaded": int(audio_pipeline.models_loaded())
+        }),
+        mimetype="text/plain; version=0.0.4"
+    )
+
+# Upload handling: files are hashed while they are written to their final
+# place, in one pass, and the server can pass a path under a shared directory
+# instead of re-uploading
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+SHARED_UPLOAD_ROOTS = [
+    os.path.realpath(root) for root in os.environ.get(
+        "SHARED_UPLOAD_ROOTS",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'server', 'uploads')
+    ).split(os.pathsep) if root
+]
+
+def unique_upload_path(filename):
+    """A new path in the upload folder for a client file name.
+
+    Every upload gets its own uuid-prefixed file, so a later upload with the
+    same name can't replace audio that a queued job still has to read, and
+    the transcript named after it is unique too.
+    """
+    name = secure_filename(filename) or 'upload'
+    return os.path.join(app.config['UPLOAD_FOLDER'], f"{uuid.uuid4().hex}_{name}")
+
+def write_stream(stream, filename):
+    """Copy a stream to a new upload file chunk by chunk, hashing as it goes."""
+    file_path = unique_upload_path(filename)
+    digest = hashlib.sha256()
+    with open(file_path, 'xb') as f:
+        for chunk in iter(lambda: stream.read(UPLOAD_CHUNK_SIZE), b''):
+            digest.update(chunk)
+            f.write(chunk)
+    seal_upload(file_path)
+    return file_path, digest.hexdigest()
+
+def seal_upload(file_path):
+    """Make a finished upload read-only.
+
+    Its hash is computed while it is written and trusted when the job runs
+    (it keys the result cache), so the file must not change in between.
+    """
+    os.chmod(file_path, 0o444)
+
+class HashingUploadFile:
+    """Multipart file part written by werkzeug straight to a new upload file, hashed on the way in.
+
+    Used as the request's stream factory, so the part is not spooled to a
+    temporary file first and then copied.
+    """
+
+    def __init__(self, filename):
+        self.path = unique_upload_path(filename)
+        self.digest = hashlib.sha256()
+        self._file = open(self.path, 'xb+')
+
+    def write(self, data):
+        self.digest.update(data)
+        return self._file.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+class UploadRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return HashingUploadFile(filename or '')
+
+app.request_class = UploadRequest
+
+def discard_file_parts(keep=None):
+    """Delete the files written for multipart parts other than `keep`."""
+    for storage in request.files.values():
+        if storage is not keep and isinstance(storage.stream, HashingUploadFile):
+            storage.close()
+            os.remove(storage.stream.path)
+
+def resolve_shared_path(path):
+    """Return the real path if it is an existing file under a shared upload root."""
+    real_path = os.path.realpath(path)
+    for root in SHARED_UPLOAD_ROOTS:
+        if os.path.commonpath([root, real_path]) == root and os.path.isfile(real_path):
+            return real_path
+    return None
+
+def receive_upload():
+    """Get the audio file for a request; returns (file_path, audio_hash, error_response).
+
+    Accepts a JSON {"file_path": ...} reference to a file in a shared upload
+    directory, a multipart 'file' field, or a raw request body named by the
+    X-Filename header or ?filename= parameter.
+    """
+    # Shared path reference: nothing is copied
+    if request.is_json:
+        file_path = resolve_shared_path((request.get_json(silent=True) or {}).get('file_path', ''))
+        if file_path is None:
+            return None, None, (jsonify({"status": "error", "error": "File path is not in a shared upload directory"}), 400)
+        logging.info(f"Referenced file: {file_path}, size: {os.path.getsize(file_path)} bytes")
+        return file_path, None, None
+    
+    if request.mimetype == 'multipart/form-data':
+        # Parsing the form writes each file part to its upload file (see UploadRequest)
+        file = request.files.get('file')
+        discard_file_parts(keep=file)
         
-        file = request.files['file']
+        # Check if file is in request
+        if file is None:
+            return None, None, (jsonify({"status": "error", "error": "No file part"}), 400)
         
         # Check if file is selected
-        if file.filename == '':
-            return jsonify({"status": "error", "error": "No file selected"}), 400
-        
-        # Save the file
-        filename = secure_filename(file.filename)
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(file_path)
+        if not file.filename:
+            file.close()
+            os.remove(file.stream.path)
+            return None, None, (jsonify({"status": "error", "error": "No file selected"}), 400)
         
-        logging.info(f"Received file: {filename}, size: {os.path.getsize(file_path)} bytes")
+        file.close()
+        file_path, audio_hash = file.stream.path, file.stream.digest.hexdigest()
+        seal_upload(file_path)
         
-        # Create a simple transcript (placeholder)
-        transcript_lines = [
-            "Speaker 1: Hello and welcome to the meeting.",
-            "Speaker 2: Thank you for joining us today.",
-            "Speaker 1: Let's discuss the agenda for today.",
-            "Speaker 2: We have several items to cover.",
-            "Speaker 1: First, let's talk about the project status.",
-            "Speaker 2: The project is progressing well.",
-            "Speaker 1: Great, let's move on to the next item."
-        ]
+        logging.info(f"Received file: {file.filename}, size: {os.path.getsize(file_path)} bytes")
+        return file_path, audio_hash, None
+    
+    # Raw body, read straight from the socket
+    filename = request.headers.get('X-Filename') or request.args.get('filename', '')
+    
+    # Check if file is selected
+    if not filename:
+        return None, None, (jsonify({"status": "error", "error": "No file selected"}), 400)
+    
+    # Save the file
+    file_path, audio_hash = write_stream(request.stream, filename)
+    
+    logging.info(f"Received file: {filename}, size: {os.path.getsize(file_path)} bytes")
+    return file_path, audio_hash, None
+
+def discard_upload(file_path):
+    """Remove a received upload that no job will process; files referenced by path are never removed"""
+    if file_path is not None and not request.is_json:
+        try:
+            os.remove(file_path)
+        except OSError:
+            pass
+
+def queue_full_response(message):
+    # Backpressure: tell the client to retry later instead of piling up work
+    return jsonify({"status": "error", "error": message}), 503, {"Retry-After": "30"}
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """Queue an uploaded audio file for processing and return its job id."""
+    # Refuse before the body is read, so a full queue costs no upload
+    if not job_queue.has_capacity():
+        return queue_full_response(f"Job queue is full ({job_queue.capacity} jobs)")
+    
+    file_path = None
+    try:
+        file_path, audio_hash, error_response = receive_upload()
+        if error_response:
+            return error_response
         
-        # Save transcript
-        base_name = os.path.splitext(filename)[0]
-        output_path = os.path.join(TRANSCRIPT_FOLDER, f"{base_name}_transcript.txt")
+        job_id = job_queue.submit(file_path, audio_hash)
+        return jsonify({"status": "success", "data": {"job_id": job_id}}), 202
         
-        with open(output_path, "w", encoding="utf-8") as f:
-            f.write("\n".join(transcript_lines))
+    except QueueFullError as e:
+        # The queue filled up while the body was being received
+        discard_upload(file_path)
+        return queue_full_response(str(e))
+    except Exception as e:
+        discard_upload(file_path)
+        logging.error(f"Error submitting job: {str(e)}")
+        logging.error(traceback.format_exc())
+        return jsonify({"status": "error", "error": str(e)}), 500
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Current state of a job."""
+    job = job_queue.store.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "error": "Job not found"}), 404
+    
+    return jsonify({
+        "status": "success",
+        "data": {
+            "job_id": job_id,
+            "state": job["status"],
+            "error": job["error"],
+            "created_at": job["created_at"],
+            "updated_at": job["updated_at"]
+        }
+    })
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    """Result of a finished job; 202 while it is still queued or running."""
+    job = job_queue.store.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "error": "Job not found"}), 404
+    
+    if job["status"] == DONE:
+        return jsonify(job["result"])
+    if job["status"] == FAILED:
+        return jsonify({"status": "error", "error": job["error"]}), 500
+    return jsonify({"status": "pending", "data": {"job_id": job_id, "state": job["status"]}}), 202
+
+@app.route('/transcripts/<name>/segment', methods=['GET'])
+def transcript_segment(name):
+    """Segment of a structured transcript being spoken at ?t=<seconds>, found through its seek index."""
+    segments_path = os.path.join(TRANSCRIPT_FOLDER, secure_filename(name) + '.jsonl')
+    if not os.path.exists(segments_path):
+        return jsonify({"status": "error", "error": "Transcript not found"}), 404
+    
+    time = request.args.get('t', type=float)
+    if time is None:
+        return jsonify({"status": "error", "error": "Missing time parameter t"}), 400
+    
+    return jsonify({"status": "success", "data": find_segment(segments_path, time)})
+
+@app.route('/process-audio', methods=['POST'])
+def process_audio():
+    """Process uploaded audio file and return transcript (synchronous; prefer /jobs)."""
+    try:
+        file_path, audio_hash, error_response = receive_upload()
+        if error_response:
+            return error_response
         
-        # Return success response
-        return jsonify({
-            "status": "success",
-            "data": {
-                "file_path": output_path,
-                "transcript": "\n".join(transcript_lines),
-                "speakers": ["Speaker 1", "Speaker 2"],
-                "duration": 0  # Placeholder
-            }
-        })
+        # Transcribe with the warm models held by this process
+        result = audio_pipeline.process_file(file_path, transcript_dir=TRANSCRIPT_FOLDER, audio_hash=audio_hash)
+        return jsonify(result)
         
     except Exception as e:
         logging.error(f"Error processing audio: {str(e)}")
@@ -90,4 +311,10 @@ def process_audio():
         }), 500
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    # Refuse to start with a Whisper configuration that can't run
+    audio_pipeline.check_whisper_backend()
+    # Load the models in the background so the server accepts requests right away;
+    # the reloader is disabled so the models are only loaded in one process
+    threading.Thread(target=warm_up_models, daemon=True).start()
+    job_queue.resume()
+    app.run(host='0.0.0.0', port=5000, debug=True, use_reloader=False)
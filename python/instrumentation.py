@@ -0,0 +1,323 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+# Directory for cProfile dumps of whole pipeline runs; profiling is off when unset
+PROFILE_DIR = os.environ.get("PROCESS_AUDIO_PROFILE")
+# While a stage is running its RSS is sampled this often to find the stage's peak
+RSS_SAMPLE_SECONDS = float(os.environ.get("RSS_SAMPLE_SECONDS", 0.05))
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def current_rss_bytes() -> Optional[int]:
+    """Resident set size of this process right now, or None when unavailable."""
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """Peak resident set size over the whole life of this process, or None when unavailable.
+
+    This is a high-water mark: in a long-lived worker it includes earlier
+    jobs, so per-stage memory is measured with current_rss_bytes instead.
+    """
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Reported in bytes on macOS and kilobytes elsewhere
+        return peak if sys.platform == "darwin" else peak * 1024
+    try:
+        import psutil
+    except ImportError:
+        return None
+    memory = psutil.Process().memory_info()
+    return getattr(memory, "peak_wset", memory.rss)
+
+
+class RssSampler:
+    """Samples current RSS in a background thread while at least one stage is active.
+
+    Keeps the highest RSS seen while each stage name was active. The thread
+    exits whenever no stage is active and is started again by the next
+    enter(), so an idle or abandoned run leaves nothing running.
+    """
+
+    def __init__(self, interval: float = RSS_SAMPLE_SECONDS):
+        self.interval = interval
+        self.peaks: Dict[str, int] = {}
+        self._active: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def enter(self, name: str):
+        with self._lock:
+            self._active[name] = self._active.get(name, 0) + 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+                self._thread.start()
+
+    def exit(self, name: str) -> Optional[int]:
+        """Leave a stage; returns the peak RSS seen while it was active."""
+        with self._lock:
+            self._active[name] -= 1
+            if not self._active[name]:
+                del self._active[name]
+            return self.peaks.get(name)
+
+    def record(self, rss: Optional[int]):
+        """Count rss towards the peak of every active stage."""
+        if rss is None:
+            return
+        with self._lock:
+            for name in self._active:
+                if rss > self.peaks.get(name, 0):
+                    self.peaks[name] = rss
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+            self.record(current_rss_bytes())
+            time.sleep(self.interval)
+
+
+class PipelineMetrics:
+    """Per-stage wall time, CPU time, RSS and throughput for one pipeline run.
+
+    A stage can be entered several times (e.g. once per Whisper batch); its
+    times, item counts and RSS growth accumulate. Each stage records the RSS
+    when it was first entered and when it last exited; rss_growth_bytes is
+    the sum of exit minus entry RSS over its calls. rss_peak_bytes is the
+    highest RSS sampled (every RSS_SAMPLE_SECONDS) while the stage was
+    running, so it catches spikes inside a stage but can miss ones shorter
+    than the sampling interval. CPU time and RSS are process-wide, so stages
+    that run concurrently (speaker prediction next to transcription) each
+    include the other's use.
+    """
+
+    def __init__(self, rss_sample_seconds: float = RSS_SAMPLE_SECONDS):
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self.audio_seconds: Optional[float] = None
+        self._lock = threading.Lock()
+        self._sampler = RssSampler(rss_sample_seconds)
+        self._rss_start = current_rss_bytes()
+        self._rss_end = None
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        self._wall_end = None
+        self._cpu_end = None
+
+    def _stage(self, name: str) -> Dict[str, Any]:
+        return self.stages.setdefault(name, {
+            "wall_seconds": 0.0,
+            "cpu_seconds": 0.0,
+            "calls": 0,
+            "items": 0,
+            "cached": False,
+            "rss_start_bytes": None,
+            "rss_end_bytes": None,
+            "rss_growth_bytes": None,
+            "rss_peak_bytes": None
+        })
+
+    @contextmanager
+    def stage(self, name: str, items: int = 0):
+        rss_start = current_rss_bytes()
+        self._sampler.enter(name)
+        self._sampler.record(rss_start)
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            rss_end = current_rss_bytes()
+            self._sampler.record(rss_end)
+            rss_peak = self._sampler.exit(name)
+            with self._lock:
+                entry = self._stage(name)
+                entry["wall_seconds"] += wall
+                entry["cpu_seconds"] += cpu
+                entry["calls"] += 1
+                entry["items"] += items
+                if rss_start is not None and rss_end is not None:
+                    if entry["rss_start_bytes"] is None:
+                        entry["rss_start_bytes"] = rss_start
+                    entry["rss_end_bytes"] = rss_end
+                    entry["rss_growth_bytes"] = (entry["rss_growth_bytes"] or 0) + rss_end - rss_start
+                if rss_peak is not None:
+                    entry["rss_peak_bytes"] = max(entry["rss_peak_bytes"] or 0, rss_peak)
+
+    def add_items(self, name: str, items: int):
+        with self._lock:
+            self._stage(name)["items"] += items
+
+    def mark_cached(self, name: str):
+        """Record that a stage's result came from the result cache."""
+        with self._lock:
+            self._stage(name)["cached"] = True
+
+    def timed_iter(self, name: str, iterable: Iterable) -> Iterator:
+        """Yield from iterable, timing each step as one item of the stage."""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name, items=1):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    # The final, empty step is not an item
+                    self.add_items(name, -1)
+                    return
+            yield item
+
+    def finish(self):
+        self._wall_end = time.perf_counter()
+        self._cpu_end = time.process_time()
+        self._rss_end = current_rss_bytes()
+
+    def summary(self) -> Dict[str, Any]:
+        wall_end = self._wall_end if self._wall_end is not None else time.perf_counter()
+        cpu_end = self._cpu_end if self._cpu_end is not None else time.process_time()
+        total_wall = wall_end - self._wall_start
+
+        with self._lock:
+            stages = {}
+            for name, entry in self.stages.items():
+                stage = dict(entry)
+                stage["items_per_second"] = (
+                    entry["items"] / entry["wall_seconds"] if entry["items"] and entry["wall_seconds"] > 0 else None
+                )
+                stages[name] = stage
+
+        return {
+            "stages": stages,
+            "wall_seconds": total_wall,
+            "cpu_seconds": cpu_end - self._cpu_start,
+            "rss_start_bytes": self._rss_start,
+            "rss_end_bytes": self._rss_end if self._rss_end is not None else current_rss_bytes(),
+            # High-water mark of the whole process, including any earlier runs
+            "process_peak_rss_bytes": peak_rss_bytes(),
+            "audio_seconds": self.audio_seconds,
+            # Processing time per second of audio; below 1 is faster than real time
+            "real_time_factor": total_wall / self.audio_seconds if self.audio_seconds else None
+        }
+
+
+class MetricsRegistry:
+    """Process-wide totals of finished runs, rendered in the Prometheus text format."""
+
+    def __init__(self, prefix: str = "audio_pipeline"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.audio_seconds = 0.0
+        self.wall_seconds = 0.0
+        self.last_real_time_factor = None
+        self.stage_totals: Dict[str, Dict[str, float]] = {}
+
+    def observe(self, summary: Dict[str, Any]):
+        with self._lock:
+            self.runs += 1
+            self.audio_seconds += summary.get("audio_seconds") or 0.0
+            self.wall_seconds += summary["wall_seconds"]
+            if summary.get("real_time_factor") is not None:
+                self.last_real_time_factor = summary["real_time_factor"]
+            for name, stage in summary["stages"].items():
+                totals = self.stage_totals.setdefault(
+                    name, {"wall_seconds": 0.0, "cpu_seconds": 0.0, "items": 0, "cache_hits": 0}
+                )
+                totals["wall_seconds"] += stage["wall_seconds"]
+                totals["cpu_seconds"] += stage["cpu_seconds"]
+                totals["items"] += stage["items"]
+                totals["cache_hits"] += int(stage["cached"])
+
+    def render(self, gauges: Optional[Dict[str, float]] = None) -> str:
+        p = self.prefix
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {p}_{name} {help_text}")
+            lines.append(f"# TYPE {p}_{name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{p}_{name}{labels} {value}")
+
+        with self._lock:
+            metric("runs_total", "counter", "Finished pipeline runs.", [("", self.runs)])
+            metric("audio_seconds_total", "counter", "Seconds of audio processed.", [("", self.audio_seconds)])
+            metric("wall_seconds_total", "counter", "Wall time spent in pipeline runs.", [("", self.wall_seconds)])
+            if self.last_real_time_factor is not None:
+                metric("last_real_time_factor", "gauge", "Real-time factor of the last run.",
+                       [("", self.last_real_time_factor)])
+
+            stages = sorted(self.stage_totals.items())
+            for key, kind, help_text in (
+                ("wall_seconds", "counter", "Wall time spent per stage."),
+                ("cpu_seconds", "counter", "Process CPU time spent per stage."),
+                ("items", "counter", "Segments processed per stage."),
+                ("cache_hits", "counter", "Stage results served from the result cache."),
+            ):
+                metric(f"stage_{key}_total", kind, help_text,
+                       [(f'{{stage="{name}"}}', totals[key]) for name, totals in stages])
+
+        rss = current_rss_bytes()
+        if rss is not None:
+            metric("rss_bytes", "gauge", "Resident set size of the process.", [("", rss)])
+        peak = peak_rss_bytes()
+        if peak is not None:
+            metric("peak_rss_bytes", "gauge", "Peak resident set size over the life of the process.", [("", peak)])
+        for name, value in (gauges or {}).items():
+            metric(name, "gauge", name.replace("_", " ").capitalize() + ".", [("", value)])
+
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+@contextmanager
+def profile_run(name: str, profile_dir: Optional[str] = PROFILE_DIR):
+    """Profile the enclosed block with cProfile when profile_dir is set.
+
+    The stats are dumped to <profile_dir>/<name>-<timestamp>.prof (readable
+    with pstats or snakeviz) and the top entries are logged. For a sampling
+    view of a live process, attach py-spy to its pid instead.
+    """
+    if not profile_dir:
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        os.makedirs(profile_dir, exist_ok=True)
+        path = os.path.join(profile_dir, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.prof")
+        profiler.dump_stats(path)
+
+        report = io.StringIO()
+        pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(20)
+        logging.info(f"Profile written to {path}\n{report.getvalue()}")
@@ -0,0 +1,143 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class QueueFullError(Exception):
+    """Raised when the queue already holds its maximum number of jobs."""
+
+
+class JobStore:
+    """SQLite-backed job records, so queued and finished jobs survive restarts."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, status TEXT NOT NULL, file_path TEXT NOT NULL, "
+                "result TEXT, error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL, "
+                "audio_hash TEXT)"
+            )
+            # Stores created before audio_hash was recorded
+            columns = {row["name"] for row in self._connection.execute("PRAGMA table_info(jobs)")}
+            if "audio_hash" not in columns:
+                self._connection.execute("ALTER TABLE jobs ADD COLUMN audio_hash TEXT")
+
+    def create(self, file_path: str, audio_hash: Optional[str] = None) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT INTO jobs (id, status, file_path, audio_hash, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, file_path, audio_hash, now, now)
+            )
+        return job_id
+
+    def update(self, job_id: str, status: str, result: Optional[Dict[str, Any]] = None,
+               error: Optional[str] = None):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE id = ?",
+                (status, json.dumps(result) if result is not None else None, error, time.time(), job_id)
+            )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def unfinished(self) -> List[Tuple[str, str, Optional[str]]]:
+        """(job_id, file_path, audio_hash) of jobs that were queued or running, oldest first."""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT id, file_path, audio_hash FROM jobs WHERE status IN (?, ?) ORDER BY created_at",
+                (QUEUED, RUNNING)
+            ).fetchall()
+        return [(row["id"], row["file_path"], row["audio_hash"]) for row in rows]
+
+
+class JobQueue:
+    """Bounded worker pool that runs handler(file_path, audio_hash) for each submitted job.
+
+    At most max_workers jobs run at once and at most max_pending more wait;
+    further submissions raise QueueFullError so callers can push back.
+    """
+
+    def __init__(self, store: JobStore, handler: Callable[[str, Optional[str]], Dict[str, Any]],
+                 max_workers: int = 1, max_pending: int = 8):
+        self.store = store
+        self.handler = handler
+        self.capacity = max_workers + max_pending
+        self.logger = logging.getLogger(__name__)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job-worker")
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def has_capacity(self) -> bool:
+        """Whether a job submitted now would be accepted; lets callers refuse work before receiving it."""
+        with self._lock:
+            return self._active < self.capacity
+
+    def submit(self, file_path: str, audio_hash: Optional[str] = None) -> str:
+        with self._lock:
+            if self._active >= self.capacity:
+                raise QueueFullError(f"Job queue is full ({self.capacity} jobs)")
+            self._active += 1
+
+        try:
+            job_id = self.store.create(file_path, audio_hash)
+            self._executor.submit(self._run, job_id, file_path, audio_hash)
+        except Exception:
+            # The job never reached a worker, so nothing else releases its slot
+            with self._lock:
+                self._active -= 1
+            raise
+        self.logger.info(f"Queued job {job_id} for {file_path}")
+        return job_id
+
+    def resume(self):
+        """Requeue jobs left queued or running by a previous process."""
+        for job_id, file_path, audio_hash in self.store.unfinished():
+            with self._lock:
+                self._active += 1
+            self.store.update(job_id, QUEUED)
+            self._executor.submit(self._run, job_id, file_path, audio_hash)
+            self.logger.info(f"Resumed job {job_id} for {file_path}")
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._active
+
+    def _run(self, job_id: str, file_path: str, audio_hash: Optional[str] = None):
+        try:
+            self.store.update(job_id, RUNNING)
+            result = self.handler(file_path, audio_hash)
+            self.store.update(job_id, DONE, result=result)
+            self.logger.info(f"Job {job_id} finished")
+        except Exception as e:
+            self.logger.error(f"Job {job_id} failed: {str(e)}", exc_info=True)
+            self.store.update(job_id, FAILED, error=str(e))
+        finally:
+            with self._lock:
+                self._active -= 1
@@ -1,25 +1,98 @@
 import os
 import re
 import numpy as np
-import tensorflow as tf
-from tensorflow.keras.models import load_model
 import librosa
 import logging
-from pyannote.audio import Model
-from pyannote.audio.pipelines import VoiceActivityDetection, OverlappedSpeechDetection
 import soundfile as sf
-from concurrent.futures import ThreadPoolExecutor
-import noisereduce as nr
-from transformers import AutoProcessor, AutoModelForSpeechSeq2Seq
-import torch
-from deep_translator import GoogleTranslator
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import shutil
+import subprocess
+import tempfile
+import bisect
 import sys
 import json
+import threading
 import traceback
 
+import diarization
+from audio_service import AudioService
+# Heavy backends are imported on first use, see backend_imports
+from backend_imports import get_import_report, import_backend
+from speaker_index import DEFAULT_INDEX_DIR, clips_fingerprint, find_reference_clips, load_or_build_index
+from instrumentation import REGISTRY, PipelineMetrics, profile_run
+from result_cache import create_default_cache, hash_file
+from transcript_assembler import TranscriptAssembler, format_turn
+from transcript_index import StructuredTranscriptWriter
+from translation_backends import (GoogleTranslationBackend, create_default_translation_cache,
+                                  translate_chunks)
+
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+def _trie_to_pattern(node):
+    branches = [re.escape(char) + _trie_to_pattern(child)
+                for char, child in sorted(node.items()) if char]
+    if not branches:
+        return ''
+    pattern = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+    if '' in node:
+        # A term ends here; the longer continuation is tried first
+        pattern = '(?:' + pattern + ')?'
+    return pattern
+
+def build_term_regex(terms):
+    """Compile terms into one case-insensitive, word-bounded regex built from a character trie.
+
+    Shared prefixes are factored out, so matching cost stays flat as the term
+    dictionaries grow instead of trying every term at every position.
+    """
+    trie = {}
+    for term in terms:
+        node = trie
+        for char in term.lower():
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    if not trie:
+        return None
+    return re.compile(r'\b(?:' + _trie_to_pattern(trie) + r')\b', re.IGNORECASE)
+
+class CorrectionEngine:
+    """Precompiled transcript corrections applied in a fixed number of passes.
+
+    All term patterns are merged into a single trie regex, and the Filipino
+    and time-format rules into a single alternation, so each text is scanned
+    twice regardless of how many entries the dictionaries hold.
+    """
+
+    def __init__(self, term_map, rules):
+        self.term_map = term_map
+        self.term_regex = build_term_regex(term_map)
+
+        # Each rule is its own named alternative; the individual pattern is
+        # kept to expand back-references such as \1 in the replacement
+        self.rules = [(re.compile(pattern, re.IGNORECASE), replacement) for pattern, replacement in rules]
+        self.rule_regex = re.compile(
+            '|'.join(f'(?P<r{i}>{pattern})' for i, (pattern, _) in enumerate(rules)),
+            re.IGNORECASE
+        ) if rules else None
+
+    def _replace_term(self, match):
+        text = match.group(0)
+        return self.term_map.get(text.lower(), text)
+
+    def _replace_rule(self, match):
+        rule_regex, replacement = self.rules[int(match.lastgroup[1:])]
+        return rule_regex.sub(replacement, match.group(0), count=1)
+
+    def apply(self, text):
+        if self.term_regex is not None:
+            text = self.term_regex.sub(self._replace_term, text)
+        if self.rule_regex is not None:
+            text = self.rule_regex.sub(self._replace_rule, text)
+        return text
+
 class TranscriptionProcessor:
     def __init__(self):
         # Academic roles and titles
@@ -69,6 +142,9 @@ class TranscriptionProcessor:
             r'\b(\d{1,2})(\d{2})\s*pm\b': r'\1:\2 PM'
         }
 
+        # Compiled on first use; call invalidate_corrections() after editing the dictionaries
+        self._correction_engine = None
+
     def create_term_patterns(self):
         patterns = {}
         all_terms = set()
@@ -94,9 +170,42 @@ class TranscriptionProcessor:
 
         return patterns
 
+    def create_term_map(self):
+        """Lowercased term (or significant part of a term) -> properly capitalized form"""
+        term_map = {}
+        for term in set().union(self.academic_roles, self.academic_terms, self.departments, self.known_names):
+            term_map[term.lower()] = term
+
+            # For multi-word terms, also map the significant parts
+            if ' ' in term:
+                for part in term.split():
+                    if len(part) > 1 and not part.lower() in ['v.', 'p.', 'c.', 'r.']:  # Skip initials
+                        term_map.setdefault(part.lower(), part)
+
+        return term_map
+
+    def get_correction_engine(self):
+        if self._correction_engine is None:
+            rules = list(self.filipino_corrections.items()) + list(self.time_formats.items())
+            self._correction_engine = CorrectionEngine(self.create_term_map(), rules)
+        return self._correction_engine
+
+    def invalidate_corrections(self):
+        self._correction_engine = None
+
 class TranscriptTranslator:
-    def __init__(self):
-        self.translator = GoogleTranslator(source='tl', target='en')
+    def __init__(self, backend=None, cache=None):
+        # Any TranslationBackend works here, e.g. StubTranslationBackend offline
+        if backend is None:
+            deep_translator = import_backend("deep_translator")
+            backend = GoogleTranslationBackend(lambda: deep_translator.GoogleTranslator(source='tl', target='en'),
+                                               source='tl', target='en')
+            # Phrase-level translations persist across jobs; an injected
+            # backend only gets a cache when one is passed explicitly
+            if cache is None:
+                cache = create_default_translation_cache()
+        self.backend = backend
+        self.cache = cache
 
         # Academic and meeting-specific terms to preserve
         self.academic_terms = {
@@ -115,34 +224,42 @@ class TranscriptTranslator:
             'Romel P. Serrano', 'Gener Mosico', 'Edward Flores'
         }
 
+        # All terms are found with one precompiled scan per chunk
+        self.term_regex = build_term_regex(self.academic_terms)
+        self.term_lookup = {term.lower(): term for term in self.academic_terms}
+
+    def find_terms(self, text: str):
+        """Academic terms present in text, in order of appearance"""
+        if self.term_regex is None:
+            return []
+        found = (self.term_lookup.get(match.group(0).lower()) for match in self.term_regex.finditer(text))
+        return [term for term in dict.fromkeys(found) if term]
+
+    def restore_terms(self, chunk: str, translated_chunk: str) -> str:
+        # Preserve terms directly instead of using placeholders
+        for term in self.find_terms(chunk):
+            if term.lower() not in translated_chunk.lower():
+                # If term is completely missing, append it
+                translated_chunk += f" {term}"
+        return translated_chunk
+
+    def translate_texts(self, texts):
+        """Translate many texts at once while preserving terms.
+
+        Chunks from every text are deduplicated, served from the cache where
+        possible, and sent to the backend in concurrent batches.
+        """
+        # Split texts into chunks to handle long texts
+        chunked = [[chunk.strip() for chunk in text.split('.') if chunk.strip()] for text in texts]
+        translated = iter(translate_chunks(self.backend, [chunk for chunks in chunked for chunk in chunks], self.cache))
+
+        return ['. '.join(self.restore_terms(chunk, next(translated)) for chunk in chunks)
+                for chunks in chunked]
+
     def translate_text(self, text: str) -> str:
         """Translate text while preserving terms"""
         try:
-            # Split text into chunks to handle long texts
-            chunks = text.split('.')
-            chunks = [chunk.strip() for chunk in chunks if chunk.strip()]
-
-            translated_chunks = []
-            for chunk in chunks:
-                # Instead of using placeholders, directly preserve the terms
-                preserved_terms = []
-                for term in self.academic_terms:
-                    if term.lower() in chunk.lower():
-                        preserved_terms.append(term)
-
-                # Translate the chunk
-                translated_chunk = self.translator.translate(chunk)
-
-                # Restore preserved terms by finding their approximate position
-                for term in preserved_terms:
-                    translated_lower = translated_chunk.lower()
-                    if term.lower() not in translated_lower:
-                        # If term is completely missing, append it
-                        translated_chunk += f" {term}"
-
-                translated_chunks.append(translated_chunk)
-
-            return '. '.join(translated_chunks)
+            return self.translate_texts([text])[0]
 
         except Exception as e:
             logging.error(f"Translation error: {e}")
@@ -158,7 +275,7 @@ class TranscriptTranslator:
 
     def process_lines(self, lines):
         """Process transcript lines with enhanced cleaning and translation"""
-        processed_lines = []
+        cleaned_lines = []
 
         for line in lines:
             if ":" not in line:
@@ -176,25 +293,51 @@ class TranscriptTranslator:
                 if not cleaned_text:
                     continue
 
-                translated_text = self.translate_text(cleaned_text)
-                processed_lines.append(f"{speaker}: {translated_text}")
+                cleaned_lines.append((speaker, cleaned_text))
 
             except Exception as e:
                 logging.error(f"Error processing line: {line}. Error: {e}")
                 continue
 
-        return processed_lines
-
-# Initialize Whisper model and processor
-# Using a public model instead of the private one
-processor = AutoProcessor.from_pretrained("openai/whisper-small")
-whisper_model = AutoModelForSpeechSeq2Seq.from_pretrained("openai/whisper-small")
+        # Translate every line in one batched pass
+        try:
+            translated_texts = self.translate_texts([text for _, text in cleaned_lines])
+        except Exception as e:
+            logging.error(f"Translation error: {e}")
+            translated_texts = [text for _, text in cleaned_lines]
+
+        return [f"{speaker}: {translated_text}"
+                for (speaker, _), translated_text in zip(cleaned_lines, translated_texts)]
+
+# Models are loaded once per process by load_models() and kept warm, so a
+# long-lived worker (see flask_app.py) only pays the load cost at startup
+WHISPER_MODEL_NAME = "openai/whisper-small"
+SEGMENTATION_MODEL_NAME = "pyannote/segmentation-3.0"
+
+processor = None
+whisper_model = None
+whisper_device = None
+segmentation_model = None
+segmentation_inference = None
+vad_binarize = None
+osd_binarize = None
+_models_loaded = False
+_models_lock = threading.Lock()
 
 # Load speaker model - commented out as the model file is missing
-# model_speaker = load_model("speaker-model.keras")
+# model_speaker = import_backend("tensorflow").keras.models.load_model("speaker-model.keras")
 # Using a placeholder for now
 model_speaker = None
 
+# Without the classifier, speakers come from clustering segment embeddings
+# (speechbrain ECAPA, or a spectral fallback) and clusters are named after
+# the people in the enrollment index built from reference clips under
+# DATA/audio/<name>/ (see speaker_index.py)
+SPEAKER_EMBEDDING_MODEL = os.environ.get("SPEAKER_EMBEDDING_MODEL", "speechbrain/spkrec-ecapa-voxceleb")
+speaker_embedder = None
+speaker_enrollment = None
+_enrollment_lock = threading.Lock()
+
 # Path setup
 data_directory = "DATA"
 audio_folder = "audio"
@@ -216,228 +359,1171 @@ except Exception as e:
 CONFIDENCE_THRESHOLD = 0.6
 SAMPLE_RATE = 16000
 
-# Load pyannote models - using public model without token
-try:
-    segmentation_model = Model.from_pretrained("pyannote/segmentation-3.0")
-except Exception as e:
-    print(f"Error loading segmentation model: {e}")
-    # Fallback to a simpler model or None
-    segmentation_model = None
+# Speaker classifier input: FFT magnitudes of the first 0.5 s of each segment,
+# featurized and predicted in fixed-size chunks
+SPEAKER_FEATURE_LENGTH = 8000
+SPEAKER_PREDICT_BATCH_SIZE = 256
+
+# Noise reduction runs once per recording with a noise profile estimated from
+# the non-speech parts of the VAD timeline; DENOISE=0 skips it for clean sources
+DENOISE = os.environ.get("DENOISE", "1") == "1"
+NOISE_PROFILE_SECONDS = 10.0
+DENOISE_BLOCK_SECONDS = 60.0
+DENOISE_PADDING_SECONDS = 1.0
+
+# Uploads are reduced to a 16 kHz mono FLAC intermediate and read back in
+# blocks of this length into a memory-mapped buffer
+INGEST_BLOCK_SECONDS = 30.0
+
+# Whisper inference backend, chosen when the model (or a worker) is loaded:
+# "fp32" is the plain HuggingFace model, "int8" applies torch dynamic
+# quantization to its Linear layers (CPU only) and "onnx" exports it to
+# ONNX Runtime through optimum. Check a backend against fp32 with
+# `python benchmark.py --accuracy <dir> --backends int8,onnx`
+WHISPER_BACKENDS = ("fp32", "int8", "onnx")
+WHISPER_BACKEND = os.environ.get("WHISPER_BACKEND", "fp32")
+# The ONNX export is written here once and loaded from here afterwards
+WHISPER_ONNX_DIR = os.environ.get(
+    "WHISPER_ONNX_DIR", os.path.join("pretrained_models", WHISPER_MODEL_NAME.replace("/", "_") + "-onnx")
+)
+
+# Whisper batching: segments are padded to 30 second feature windows and
+# grouped so that one generate() call serves a whole batch
+WHISPER_BATCH_SIZE = int(os.environ.get("WHISPER_BATCH_SIZE", 8))
+WHISPER_MAX_BATCH_TOKENS = int(os.environ.get("WHISPER_MAX_BATCH_TOKENS", 1200))
+WHISPER_MAX_LENGTH = 225
+WHISPER_TOKENS_PER_SECOND = 6  # Rough speech-rate estimate used for the token budget
+# Per-word start/end times from Whisper's cross-attention alignment, added to
+# the structured (JSON Lines) transcript; costs an extra alignment pass per batch
+WORD_TIMESTAMPS = os.environ.get("WORD_TIMESTAMPS", "0") == "1"
+
+# Process-pool transcription: with more than one worker, Whisper batches are
+# sharded across worker processes, each holding its own warm model copy and
+# a pinned torch thread count (defaults to an even share of the CPU cores)
+WHISPER_WORKERS = int(os.environ.get("WHISPER_WORKERS", 1))
+WHISPER_WORKER_THREADS = int(os.environ.get("WHISPER_WORKER_THREADS",
+                                            max(1, (os.cpu_count() or 1) // max(1, WHISPER_WORKERS))))
+
+# Speech and overlap thresholds, matching the former VAD/OSD pipeline settings
+VAD_PARAMS = {"min_duration_on": 0.5, "min_duration_off": 0.0}
+OSD_PARAMS = {"min_duration_on": 0.0, "min_duration_off": 0.0}
+# Trim overlapped portions out of segments instead of dropping whole segments;
+# trimmed pieces shorter than the VAD minimum speech duration are discarded
+TRIM_OVERLAPS = os.environ.get("TRIM_OVERLAPS", "0") == "1"
+# What happens to segments that touch overlapped speech: "drop" them, "trim"
+# the overlapped parts out, or "split" them at the overlap boundaries and
+# transcribe the overlapped parts too, in their own Whisper batches; those
+# segments are flagged as overlap and have no speaker or confidence
+OVERLAP_MODES = ("drop", "trim", "split")
+OVERLAP_MODE = os.environ.get("OVERLAP_MODE", "trim" if TRIM_OVERLAPS else "drop")
+
+# Segment planning: regions longer than Whisper's 30 second window are split
+# at their quietest point, and short neighbouring regions of the same speaker
+# (at most SEGMENT_MAX_GAP_SECONDS apart) are merged into windows of up to
+# SEGMENT_TARGET_SECONDS, so less of each log-mel window is padding and
+# nothing is truncated. Merging needs every speaker label first, so
+# transcription waits for speaker prediction; streaming runs only split, so
+# their first partial results arrive while speakers are still being predicted
+PLAN_SEGMENTS = os.environ.get("PLAN_SEGMENTS", "1") == "1"
+SEGMENT_TARGET_SECONDS = float(os.environ.get("SEGMENT_TARGET_SECONDS", 15.0))
+SEGMENT_MAX_GAP_SECONDS = float(os.environ.get("SEGMENT_MAX_GAP_SECONDS", 0.5))
+WHISPER_WINDOW_SECONDS = 30.0
+SPLIT_ENERGY_FRAME_SECONDS = 0.05
+SEGMENTATION_ONSET = 0.5
+SEGMENTATION_OFFSET = 0.5
+
+# Stage results are cached by audio content hash plus the settings below, so a
+# re-submitted recording skips model loading, decoding, segmentation and
+# Whisper. The settings are configuration only, never loaded model state, so
+# a cache hit is found before any model is loaded; results produced by a
+# fallback (a model that failed to load) are not cached
+result_cache = create_default_cache()
+
+def segmentation_cache_config():
+    return {
+        "model": SEGMENTATION_MODEL_NAME,
+        "vad": VAD_PARAMS,
+        "osd": OSD_PARAMS,
+        "onset": SEGMENTATION_ONSET,
+        "offset": SEGMENTATION_OFFSET
+    }
+
+def segment_split_cache_config(pieces):
+    return {
+        "max_seconds": WHISPER_WINDOW_SECONDS,
+        "frame_seconds": SPLIT_ENERGY_FRAME_SECONDS,
+        "pieces": pieces
+    }
+
+def embedding_cache_config(segments):
+    return {
+        "model": SPEAKER_EMBEDDING_MODEL,
+        "max_seconds": diarization.EMBEDDING_MAX_SECONDS,
+        "denoise": DENOISE,
+        "segments": segments
+    }
+
+def speaker_cache_config(segments):
+    return {
+        "model": "speaker-model.keras" if model_speaker is not None else None,
+        "embedding_model": SPEAKER_EMBEDDING_MODEL,
+        "cluster_threshold": diarization.CLUSTER_THRESHOLD,
+        "match_threshold": diarization.ENROLLMENT_MATCH_THRESHOLD,
+        # From file stats, the same identity the enrollment index is rebuilt on
+        "enrollment": clips_fingerprint(find_reference_clips(audio_path), SPEAKER_EMBEDDING_MODEL),
+        "class_names": sorted(class_names),
+        "denoise": DENOISE,
+        "threshold": CONFIDENCE_THRESHOLD,
+        "segments": segments
+    }
+
+def transcription_cache_config(segments):
+    return {
+        "model": WHISPER_MODEL_NAME,
+        "backend": WHISPER_BACKEND,
+        "max_length": WHISPER_MAX_LENGTH,
+        "word_timestamps": WORD_TIMESTAMPS,
+        "denoise": DENOISE,
+        "segments": segments
+    }
+
+def speakers_cacheable():
+    """Whether speaker results come from the configured models rather than a fallback"""
+    if model_speaker is not None:
+        return True
+    return speaker_embedder is not None and speaker_embedder.name == SPEAKER_EMBEDDING_MODEL
+
+def speech_and_overlap_scores(scores):
+    """Reduce per-speaker frame scores to [second most active, most active].
+
+    The highest speaker activation is the speech score (as in pyannote's
+    VoiceActivityDetection) and the second highest is the overlapped-speech
+    score (as in OverlappedSpeechDetection), so one forward pass serves both.
+    """
+    return np.sort(scores, axis=-1)[:, :, -2:]
+
+def check_whisper_backend(backend=None, word_timestamps=WORD_TIMESTAMPS):
+    """Raise ValueError for a backend (or backend and option combination) that can't run"""
+    backend = backend or WHISPER_BACKEND
+    if backend not in WHISPER_BACKENDS:
+        raise ValueError(f"Unknown Whisper backend {backend!r}, expected one of {', '.join(WHISPER_BACKENDS)}")
+    if backend == "onnx" and word_timestamps:
+        # ORTModelForSpeechSeq2Seq.generate has no cross-attention alignment output
+        raise ValueError("WORD_TIMESTAMPS=1 is not supported by the onnx Whisper backend")
+
+def export_onnx_whisper(export_dir=WHISPER_ONNX_DIR):
+    """Export Whisper to ONNX into export_dir unless an export is already there; returns export_dir"""
+    if os.path.exists(os.path.join(export_dir, "config.json")):
+        return export_dir
+
+    logging.info(f"Exporting {WHISPER_MODEL_NAME} to ONNX in {export_dir}")
+    onnxruntime = import_backend("optimum.onnxruntime")
+    model = onnxruntime.ORTModelForSpeechSeq2Seq.from_pretrained(WHISPER_MODEL_NAME, export=True)
+    # Written beside the target and renamed, so a reader never sees a partial export
+    temp_dir = f"{export_dir}.{os.getpid()}.tmp"
+    model.save_pretrained(temp_dir)
+    try:
+        os.replace(temp_dir, export_dir)
+    except OSError:
+        # Another process finished an export first
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    return export_dir
+
+def load_whisper_model(backend=None):
+    """Load the Whisper processor and model into this process with the given inference backend"""
+    global processor, whisper_model, whisper_device
+
+    if whisper_model is not None:
+        return
+
+    backend = backend or WHISPER_BACKEND
+    check_whisper_backend(backend)
+
+    logging.info(f"Loading Whisper model: {WHISPER_MODEL_NAME} ({backend})")
+    transformers = import_backend("transformers")
+    torch = import_backend("torch")
+    # Using a public model instead of the private one
+    processor = transformers.AutoProcessor.from_pretrained(WHISPER_MODEL_NAME)
+
+    if backend == "onnx":
+        # Exported once to WHISPER_ONNX_DIR; later loads skip the export
+        onnxruntime = import_backend("optimum.onnxruntime")
+        whisper_model = onnxruntime.ORTModelForSpeechSeq2Seq.from_pretrained(export_onnx_whisper())
+        whisper_device = "cpu"
+        return
+
+    whisper_model = transformers.AutoModelForSpeechSeq2Seq.from_pretrained(WHISPER_MODEL_NAME)
+    whisper_model.eval()
+
+    if backend == "int8":
+        # Weights are stored as int8 and activations quantized on the fly;
+        # quantized kernels only exist for the CPU
+        whisper_model = torch.quantization.quantize_dynamic(whisper_model, {torch.nn.Linear}, dtype=torch.qint8)
+        whisper_device = "cpu"
+        return
+
+    whisper_device = "cuda" if torch.cuda.is_available() else "cpu"
+    whisper_model.to(whisper_device)
+
+_whisper_pool = None
+
+def _init_whisper_worker(torch_threads, backend):
+    global WHISPER_BACKEND
+
+    # Pin the thread count so workers don't oversubscribe the cores
+    torch = import_backend("torch")
+    torch.set_num_threads(torch_threads)
+    torch.set_num_interop_threads(1)
+    WHISPER_BACKEND = backend
+    load_whisper_model()
+
+def get_whisper_pool():
+    """Start the Whisper worker processes once and keep them warm"""
+    global _whisper_pool
+
+    if _whisper_pool is None:
+        if WHISPER_BACKEND == "onnx":
+            # Export once here rather than racing to export in every worker
+            export_onnx_whisper()
+        logging.info(f"Starting {WHISPER_WORKERS} Whisper workers with {WHISPER_WORKER_THREADS} threads each")
+        _whisper_pool = ProcessPoolExecutor(
+            max_workers=WHISPER_WORKERS,
+            initializer=_init_whisper_worker,
+            initargs=(WHISPER_WORKER_THREADS, WHISPER_BACKEND)
+        )
+        # Workers are spawned on demand; submit no-op tasks so they all start
+        # (and load their models) now rather than on the first job
+        for _ in range(WHISPER_WORKERS):
+            _whisper_pool.submit(load_whisper_model)
+    return _whisper_pool
+
+def load_speaker_embedder():
+    """ECAPA speaker embeddings via speechbrain, falling back to spectral voice prints"""
+    try:
+        torch = import_backend("torch")
+        try:
+            speaker_backend = import_backend("speechbrain.inference.speaker")
+        except ImportError:
+            # speechbrain < 1.0
+            speaker_backend = import_backend("speechbrain.pretrained")
+        classifier = speaker_backend.EncoderClassifier.from_hparams(
+            source=SPEAKER_EMBEDDING_MODEL,
+            savedir=os.path.join("pretrained_models", SPEAKER_EMBEDDING_MODEL.replace("/", "_")),
+            run_opts={"device": "cuda" if torch.cuda.is_available() else "cpu"}
+        )
+        return diarization.EcapaEmbedder(classifier, torch, SPEAKER_EMBEDDING_MODEL)
+    except Exception as e:
+        logging.error(f"Error loading speaker embedding model: {e}")
+        logging.info("Using spectral speaker embeddings")
+        return diarization.SpectralEmbedder()
+
+def load_models():
+    """Load Whisper and the pyannote segmentation model once; later calls are no-ops"""
+    global segmentation_model, segmentation_inference
+    global vad_binarize, osd_binarize, _models_loaded
+    global speaker_embedder
+
+    with _models_lock:
+        if _models_loaded:
+            return
+
+        # Fail before any model is loaded rather than partway through a job
+        check_whisper_backend()
+
+        # In process-pool mode the workers hold the Whisper copies
+        if WHISPER_WORKERS > 1:
+            get_whisper_pool()
+        else:
+            load_whisper_model()
+
+        # Load pyannote models - using public model without token
+        try:
+            pyannote_audio = import_backend("pyannote.audio")
+            segmentation_model = pyannote_audio.Model.from_pretrained(SEGMENTATION_MODEL_NAME)
+        except Exception as e:
+            logging.error(f"Error loading segmentation model: {e}")
+            # Fallback to a simpler model or None
+            segmentation_model = None
 
-# Initialize pipelines
-try:
-    if segmentation_model is not None:
-        vad_pipeline = VoiceActivityDetection(segmentation=segmentation_model)
-        vad_pipeline.instantiate({"min_duration_on": 0.5, "min_duration_off": 0.0})
+        # Single segmentation pass shared by speech and overlap detection
+        try:
+            if segmentation_model is not None:
+                signal = import_backend("pyannote.audio.utils.signal")
+                segmentation_inference = pyannote_audio.Inference(
+                    segmentation_model,
+                    pre_aggregation_hook=speech_and_overlap_scores
+                )
+                vad_binarize = signal.Binarize(onset=SEGMENTATION_ONSET, offset=SEGMENTATION_OFFSET, **VAD_PARAMS)
+                osd_binarize = signal.Binarize(onset=SEGMENTATION_ONSET, offset=SEGMENTATION_OFFSET, **OSD_PARAMS)
+            else:
+                logging.info("Segmentation model not available, speech and overlap detection will not be available")
+                segmentation_inference = None
+        except Exception as e:
+            logging.info(f"Error initializing segmentation: {e}")
+            segmentation_inference = None
 
-        osd_pipeline = OverlappedSpeechDetection(segmentation=segmentation_model)
-        osd_pipeline.instantiate({"min_duration_on": 0.0, "min_duration_off": 0.0})
-    else:
-        logging.info("Segmentation model not available, VAD and OSD pipelines will not be available")
-        vad_pipeline = None
-        osd_pipeline = None
-except Exception as e:
-    logging.info(f"Error initializing pipelines: {e}")
-    vad_pipeline = None
-    osd_pipeline = None
+        # Diarization replaces the missing speaker classifier
+        if model_speaker is None:
+            speaker_embedder = load_speaker_embedder()
+            refresh_speaker_enrollment()
+
+        _models_loaded = True
+        logging.info(f"Models loaded, backend import times: {get_import_report()}")
+
+def refresh_speaker_enrollment():
+    """Load the enrollment index, rebuilding it when the reference clips changed since it was built.
+
+    Called for every job, so people added under DATA/audio are picked up
+    without a restart; an up-to-date index only costs a stat of each clip.
+    """
+    global speaker_enrollment
+
+    if speaker_embedder is None:
+        return
+    # Concurrent jobs must not rebuild the index at the same time
+    with _enrollment_lock:
+        try:
+            speaker_enrollment = load_or_build_index(audio_path, DEFAULT_INDEX_DIR, speaker_embedder, load_audio)
+        except Exception as e:
+            logging.error(f"Error loading speaker enrollment: {e}")
+
+def models_loaded():
+    return _models_loaded
 
-def audio_to_fft(audio, expected_length=8000):
-    audio = audio[:expected_length] if tf.shape(audio)[0] > expected_length else tf.pad(audio, [[0, expected_length - tf.shape(audio)[0]]])
-    audio = tf.expand_dims(audio, axis=-1)
-    fft = tf.signal.fft(tf.cast(tf.complex(real=audio, imag=tf.zeros_like(audio)), tf.complex64))
-    fft = tf.expand_dims(fft, axis=1)
-    return tf.math.abs(fft[:, :(expected_length // 2), :])
+def batch_audio_to_fft(samples_list, expected_length=SPEAKER_FEATURE_LENGTH, out=None):
+    """FFT magnitude features for a batch of clips, shaped [N, expected_length // 2, 1].
 
-def reduce_noise(audio, sample_rate):
-    return nr.reduce_noise(y=audio, sr=sample_rate)
+    Clips are padded or truncated into one [N, expected_length] float32 array
+    (reusing `out` when given) and transformed with a single batched real FFT.
+    """
+    count = len(samples_list)
+    if out is None or out.shape[0] < count or out.shape[1] != expected_length:
+        out = np.empty((count, expected_length), dtype=np.float32)
+    batch = out[:count]
+    batch.fill(0.0)
+
+    for row, samples in zip(batch, samples_list):
+        length = min(len(samples), expected_length)
+        row[:length] = samples[:length]
+
+    spectrum = np.abs(np.fft.rfft(batch, axis=1)[:, :expected_length // 2])
+    return spectrum.astype(np.float32)[:, :, np.newaxis]
+
+def extract_audio_track(input_path, work_dir):
+    """Extract the audio track once as a 16 kHz mono FLAC intermediate in work_dir"""
+    try:
+        info = sf.info(input_path)
+        if info.samplerate == SAMPLE_RATE and info.channels == 1:
+            return input_path  # Already in the pipeline format
+    except Exception:
+        pass  # Not a container soundfile can read (e.g. MP4), let ffmpeg handle it
+
+    output_path = os.path.join(work_dir, "audio.flac")
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is not None:
+        # ffmpeg streams the container, so memory stays flat regardless of file size
+        result = subprocess.run(
+            [ffmpeg, "-nostdin", "-v", "error", "-y", "-i", input_path,
+             "-vn", "-ac", "1", "-ar", str(SAMPLE_RATE), "-c:a", "flac", output_path],
+            capture_output=True
+        )
+        if result.returncode != 0:
+            raise ValueError(f"Could not extract audio track: {result.stderr.decode(errors='replace').strip()}")
+        return output_path
+
+    logging.warning("ffmpeg not found, decoding the whole file in memory to build the intermediate")
+    audio, _ = librosa.load(input_path, sr=SAMPLE_RATE, mono=True, dtype=np.float32)
+    sf.write(output_path, audio, SAMPLE_RATE, format="FLAC")
+    return output_path
+
+def load_audio(audio_path, work_dir=None, sample_rate=SAMPLE_RATE):
+    """Decode the whole recording once as mono float32 at the pipeline sample rate.
+
+    With a work_dir, the audio track is extracted to a FLAC intermediate and
+    read back in fixed-size blocks into a float32 memory-mapped file, so peak
+    memory is bounded by the block size rather than the recording length.
+    """
+    if work_dir is None:
+        audio, _ = librosa.load(audio_path, sr=sample_rate, mono=True, dtype=np.float32)
+        return audio
+
+    pcm_path = extract_audio_track(audio_path, work_dir)
+    block_size = int(INGEST_BLOCK_SECONDS * sample_rate)
+
+    with sf.SoundFile(pcm_path) as f:
+        audio = np.memmap(os.path.join(work_dir, "audio.f32"), dtype=np.float32,
+                          mode="w+", shape=(max(f.frames, 1),))
+        position = 0
+        for block in f.blocks(blocksize=block_size, dtype="float32", always_2d=True):
+            audio[position:position + len(block)] = block.mean(axis=1)
+            position += len(block)
+
+    audio.flush()
+    return audio[:position]
+
+def slice_segment(audio, start, end, sample_rate=SAMPLE_RATE):
+    """Return a view of the decoded audio between start and end (in seconds)"""
+    start_sample = max(int(round(start * sample_rate)), 0)
+    end_sample = min(int(round(end * sample_rate)), len(audio))
+    return audio[start_sample:end_sample]
+
+def iter_non_speech_regions(audio, speech_segments):
+    """Yield (start_sample, end_sample) for the gaps between speech segments"""
+    position = 0
+    for start, end in sorted(speech_segments):
+        start_sample = int(start * SAMPLE_RATE)
+        if start_sample > position:
+            yield position, min(start_sample, len(audio))
+        position = max(position, int(end * SAMPLE_RATE))
+    if position < len(audio):
+        yield position, len(audio)
+
+def estimate_noise_profile(audio, speech_segments, max_seconds=NOISE_PROFILE_SECONDS):
+    """Collect up to max_seconds of non-speech audio to use as the noise profile"""
+    remaining = int(max_seconds * SAMPLE_RATE)
+    pieces = []
+    for start_sample, end_sample in iter_non_speech_regions(audio, speech_segments):
+        if remaining <= 0:
+            break
+        piece = audio[start_sample:min(end_sample, start_sample + remaining)]
+        pieces.append(piece)
+        remaining -= len(piece)
+
+    # Too little silence for a reliable profile
+    if sum(len(piece) for piece in pieces) < SAMPLE_RATE:
+        return None
+    return np.concatenate(pieces)
+
+def denoise_audio(audio, noise_clip=None, block_seconds=DENOISE_BLOCK_SECONDS,
+                  padding_seconds=DENOISE_PADDING_SECONDS, out=None):
+    """Spectral-gate the whole recording block by block.
+
+    With a noise clip the gate is stationary and uses that one profile for
+    every block; otherwise noisereduce estimates it per block. Blocks are
+    padded on both sides so there are no seams at block boundaries. The result
+    is written into `out` (e.g. a memory-mapped file) when given.
+    """
+    nr = import_backend("noisereduce")
+    denoised = out if out is not None else np.empty(audio.shape, dtype=audio.dtype)
+    block = int(block_seconds * SAMPLE_RATE)
+    padding = int(padding_seconds * SAMPLE_RATE)
+
+    for start in range(0, len(audio), block):
+        end = min(start + block, len(audio))
+        padded_start = max(0, start - padding)
+        padded_end = min(len(audio), end + padding)
+
+        reduced = nr.reduce_noise(
+            y=audio[padded_start:padded_end],
+            sr=SAMPLE_RATE,
+            y_noise=noise_clip,
+            stationary=noise_clip is not None
+        )
+        denoised[start:end] = reduced[start - padded_start:end - padded_start]
+
+    return denoised
+
+def preprocess_audio(audio, speech_segments, denoise=DENOISE, work_dir=None):
+    """Denoise the full recording once so every stage shares the cleaned signal"""
+    if not denoise:
+        return audio
+
+    noise_clip = estimate_noise_profile(audio, speech_segments)
+    logging.info("Denoising with a noise profile from non-speech regions" if noise_clip is not None
+                 else "Not enough non-speech audio for a noise profile, estimating per block")
+
+    out = None
+    if work_dir is not None:
+        out = np.memmap(os.path.join(work_dir, "denoised.f32"), dtype=np.float32,
+                        mode="w+", shape=audio.shape)
+    return denoise_audio(audio, noise_clip, out=out)
 
 def normalize_volume(audio):
     return librosa.util.normalize(audio)
 
-def segment_audio_by_vad(audio_path):
-    if vad_pipeline is None:
-        logging.info("VAD pipeline not available, using simple segmentation")
+def segment_speech_and_overlap(audio):
+    """Return (speech_segments, overlapping_segments) from one segmentation pass"""
+    if segmentation_inference is None:
+        logging.info("Segmentation not available, using simple segmentation and assuming no overlapping speech")
         # Simple fallback: create segments of 10 seconds each
-        audio_duration = librosa.get_duration(path=audio_path)
+        audio_duration = len(audio) / SAMPLE_RATE
         segment_length = 10.0  # 10 seconds per segment
         return [(i, min(i + segment_length, audio_duration))
-                for i in np.arange(0, audio_duration, segment_length)]
-
-    vad = vad_pipeline(audio_path)
-    return [(segment.start, segment.end) for segment in vad.get_timeline().support()]
-
-def detect_overlapping_speech(audio_path):
-    if osd_pipeline is None:
-        logging.info("OSD pipeline not available, assuming no overlapping speech")
-        return []  # Return empty list (no overlapping segments)
-
-    osd = osd_pipeline(audio_path)
-    return [(segment.start, segment.end) for segment in osd.get_timeline().support()]
-
-def filter_non_overlapping_segments(segments, overlapping_segments):
-    return [segment for segment in segments
-            if not any(segment[0] < os_end and segment[1] > os_start
-                      for (os_start, os_end) in overlapping_segments)]
+                for i in np.arange(0, audio_duration, segment_length)], []
+
+    torch = import_backend("torch")
+    core = import_backend("pyannote.core")
+
+    # Feed the already decoded waveform so pyannote doesn't decode the file again
+    waveform = torch.from_numpy(np.ascontiguousarray(audio, dtype=np.float32)).unsqueeze(0)
+    scores = segmentation_inference({"waveform": waveform, "sample_rate": SAMPLE_RATE})
+
+    overlap_scores = core.SlidingWindowFeature(scores.data[:, 0:1], scores.sliding_window)
+    speech_scores = core.SlidingWindowFeature(scores.data[:, 1:2], scores.sliding_window)
+
+    speech = vad_binarize(speech_scores)
+    overlap = osd_binarize(overlap_scores)
+    return ([(segment.start, segment.end) for segment in speech.get_timeline().support()],
+            [(segment.start, segment.end) for segment in overlap.get_timeline().support()])
+
+def merge_overlap_regions(overlapping_segments):
+    """Sort overlap regions and merge the ones that intersect into disjoint intervals"""
+    merged = []
+    for start, end in sorted(overlapping_segments):
+        if end < start:
+            continue
+        # Only strictly intersecting regions are merged so results match the
+        # strict interval test used by filter_non_overlapping_segments
+        if merged and start < merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [start for start, _ in merged], [end for _, end in merged]
+
+def filter_non_overlapping_segments(segments, overlapping_segments, trim=False, min_duration=0.0):
+    """Drop (or, with trim=True, cut out) the parts of segments that touch overlap regions.
+
+    Overlap regions are merged and searched with bisect, so the cost is
+    O((N + M) log M) instead of checking every segment against every region.
+    When trimming, the remaining pieces shorter than min_duration are dropped.
+    """
+    starts, ends = merge_overlap_regions(overlapping_segments)
+    filtered = []
+
+    for segment in segments:
+        start, end = segment
+        # First overlap region that ends after the segment starts
+        index = bisect.bisect_right(ends, start)
+
+        if index == len(starts) or starts[index] >= end:
+            filtered.append(segment)
+            continue
+
+        if not trim:
+            continue
+
+        # Keep the clean pieces between the overlap regions inside the segment
+        position = start
+        while index < len(starts) and starts[index] < end:
+            if starts[index] - position > min_duration:
+                filtered.append((position, starts[index]))
+            position = max(position, ends[index])
+            index += 1
+        if end - position > min_duration:
+            filtered.append((position, end))
+
+    return filtered
+
+def split_at_overlaps(segments, overlapping_segments, min_duration=0.0):
+    """Cut segments at overlap boundaries into (start, end, overlapped) pieces in timeline order.
+
+    The clean pieces are the ones trimming keeps; the overlapped parts become
+    pieces of their own instead of being dropped. Pieces of segments that
+    touch an overlap are dropped when they are not longer than min_duration.
+    """
+    starts, ends = merge_overlap_regions(overlapping_segments)
+    pieces = []
 
-def predict_speaker_for_segments(segments, audio_path, class_names):
-    # If model_speaker is None, return default speaker labels
+    for start, end in segments:
+        index = bisect.bisect_right(ends, start)
+        if index == len(starts) or starts[index] >= end:
+            pieces.append((start, end, False))
+            continue
+
+        position = start
+        while index < len(starts) and starts[index] < end:
+            if starts[index] - position > min_duration:
+                pieces.append((position, starts[index], False))
+            overlap_start = max(position, starts[index])
+            overlap_end = min(end, ends[index])
+            if overlap_end - overlap_start > min_duration:
+                pieces.append((overlap_start, overlap_end, True))
+            position = max(position, ends[index])
+            index += 1
+        if end - position > min_duration:
+            pieces.append((position, end, False))
+
+    return pieces
+
+def plan_overlap_handling(segments, overlapping_segments, mode=OVERLAP_MODE, min_duration=0.0):
+    """(start, end, overlapped) pieces to transcribe under the given overlap mode"""
+    if mode not in OVERLAP_MODES:
+        raise ValueError(f"Unknown overlap mode {mode!r}, expected one of {', '.join(OVERLAP_MODES)}")
+    if mode == "split":
+        return split_at_overlaps(segments, overlapping_segments, min_duration)
+    return [(start, end, False) for start, end in filter_non_overlapping_segments(
+        segments, overlapping_segments, trim=mode == "trim", min_duration=min_duration
+    )]
+
+def find_quiet_point(audio, start, end, frame_seconds=SPLIT_ENERGY_FRAME_SECONDS):
+    """Time of the lowest-energy frame between start and end"""
+    samples = slice_segment(audio, start, end)
+    frame = int(frame_seconds * SAMPLE_RATE)
+    frames = len(samples) // frame
+    if frames < 3:
+        return (start + end) / 2
+
+    energy = np.sqrt(np.mean(np.square(samples[:frames * frame].reshape(frames, frame), dtype=np.float32), axis=1))
+    # Smooth over neighbouring frames so a single quiet frame inside a word isn't chosen
+    energy = np.convolve(energy, np.ones(3) / 3, mode="same")
+    return start + (int(np.argmin(energy[1:-1])) + 1.5) * frame_seconds
+
+def split_long_pieces(pieces, get_audio, max_seconds=WHISPER_WINDOW_SECONDS):
+    """Split pieces longer than a Whisper window at low-energy points.
+
+    pieces are (start, end, overlapped); get_audio() is only called when a
+    piece has to be split.
+    """
+    split_pieces = []
+    for start, end, overlapped in pieces:
+        # Each cut is at least half a window in, so splits don't leave slivers
+        while end - start > max_seconds:
+            split = find_quiet_point(get_audio(), start + max_seconds / 2, start + max_seconds)
+            split_pieces.append((start, split, overlapped))
+            start = split
+        split_pieces.append((start, end, overlapped))
+    return split_pieces
+
+def merge_pieces(pieces, labels, target_seconds=SEGMENT_TARGET_SECONDS, max_gap_seconds=SEGMENT_MAX_GAP_SECONDS):
+    """Group neighbouring pieces into Whisper windows of up to target_seconds.
+
+    pieces are (start, end, overlapped) in timeline order and labels their
+    speakers (None for overlapped pieces). Only pieces with the same label
+    and overlap flag are merged, so a window never spans a speaker change.
+    Returns the piece indices of each window.
+    """
+    groups = []
+    for index, (start, end, overlapped) in enumerate(pieces):
+        if groups:
+            group = groups[-1]
+            window_start = pieces[group[0]][0]
+            _, window_end, window_overlapped = pieces[group[-1]]
+            if (window_overlapped == overlapped and labels[group[-1]] == labels[index]
+                    and start - window_end <= max_gap_seconds and end - window_start <= target_seconds):
+                group.append(index)
+                continue
+        groups.append([index])
+    return groups
+
+def diarize_segments(segments, audio, embedding_key=None):
+    """Cluster segment embeddings into speakers; embeddings are cached under embedding_key"""
+    embeddings = result_cache.get_array(embedding_key) if embedding_key is not None else None
+    if embeddings is None:
+        samples_list = [slice_segment(audio, start, end) for start, end in segments]
+        embeddings = speaker_embedder.embed(samples_list)
+        if embedding_key is not None:
+            result_cache.put_array(embedding_key, embeddings)
+    return diarization.assign_speakers(embeddings, speaker_enrollment)
+
+def predict_speaker_for_segments(segments, audio, class_names, embedding_key=None):
+    # Without the classifier, label speakers by diarization
     if model_speaker is None:
-        logging.info("Speaker model not available, using default speaker labels")
-        return [("Speaker", 1.0) for _ in segments]
+        if speaker_embedder is None:
+            logging.info("Speaker model not available, using default speaker labels")
+            return [("Speaker", 1.0) for _ in segments]
+        logging.info("Speaker model not available, diarizing segment embeddings")
+        return diarize_segments(segments, audio, embedding_key)
 
-    speaker_predictions = []
-    segment_samples_list = []
+    predictions = []
+    feature_buffer = np.empty((SPEAKER_PREDICT_BATCH_SIZE, SPEAKER_FEATURE_LENGTH), dtype=np.float32)
 
-    for start, end in segments:
-        segment_samples, _ = librosa.load(audio_path, sr=SAMPLE_RATE, offset=start, duration=end-start)
-        segment_samples = reduce_noise(segment_samples, SAMPLE_RATE)
-        segment_samples = normalize_volume(segment_samples)
-        segment_samples_list.append(segment_samples)
+    for chunk_start in range(0, len(segments), SPEAKER_PREDICT_BATCH_SIZE):
+        chunk = segments[chunk_start:chunk_start + SPEAKER_PREDICT_BATCH_SIZE]
 
-    audio_tensors = [tf.convert_to_tensor(samples, dtype=tf.float32) for samples in segment_samples_list]
-    fft_list = [audio_to_fft(tensor, expected_length=8000) for tensor in audio_tensors]
-    fft_batch = tf.stack(fft_list, axis=0)
-    predictions = model_speaker.predict(fft_batch)
+        segment_samples_list = []
+        for start, end in chunk:
+            segment_samples = slice_segment(audio, start, end)
+            segment_samples = normalize_volume(segment_samples)
+            segment_samples_list.append(segment_samples)
+
+        features = batch_audio_to_fft(segment_samples_list, out=feature_buffer)
+        predictions.extend(model_speaker.predict(features, verbose=0))
 
     return [(class_names[np.argmax(pred)], np.max(pred)) if np.max(pred) >= CONFIDENCE_THRESHOLD
             else ("Unknown", np.max(pred)) for pred in predictions]
 
-def transcribe_with_whisper(segments, audio_path):
-    transcriptions = []
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    whisper_model.to(device)
-
-    for start, end in segments:
-        # Load and process audio
-        segment_samples, sr = librosa.load(audio_path, sr=16000, offset=start, duration=end-start)
-        segment_samples = reduce_noise(segment_samples, sr)
+def estimate_segment_tokens(start, end):
+    """Rough upper bound on the number of tokens Whisper generates for a segment"""
+    estimate = int(np.ceil((end - start) * WHISPER_TOKENS_PER_SECOND)) + 4  # Prompt tokens
+    return min(estimate, WHISPER_MAX_LENGTH)
+
+def batch_segments(segments, batch_size=WHISPER_BATCH_SIZE, max_batch_tokens=WHISPER_MAX_BATCH_TOKENS):
+    """Group segment indices into batches bounded by size and estimated decoder tokens"""
+    batch_size = max(1, batch_size)
+    batch = []
+    batch_tokens = 0
+
+    for index, (start, end) in enumerate(segments):
+        tokens = estimate_segment_tokens(start, end)
+        if batch and (len(batch) >= batch_size or batch_tokens + tokens > max_batch_tokens):
+            yield batch
+            batch = []
+            batch_tokens = 0
+        batch.append(index)
+        batch_tokens += tokens
+
+    if batch:
+        yield batch
+
+def prepare_batch_samples(segments, batch, audio):
+    # Slice the shared decoded audio and process it
+    batch_samples = []
+    for index in batch:
+        start, end = segments[index]
+        segment_samples = slice_segment(audio, start, end)
         segment_samples = normalize_volume(segment_samples)
-
-        # Process audio input
-        features = processor(
-            segment_samples,
-            sampling_rate=16000,
-            return_tensors="pt"
+        batch_samples.append(segment_samples)
+    return batch_samples
+
+def transcribe_batch(batch_samples):
+    """Run one Whisper generate() call over a batch of segment samples"""
+    torch = import_backend("torch")
+    load_whisper_model()
+
+    # Every segment is padded to the same 30 second log-mel window
+    features = processor(
+        batch_samples,
+        sampling_rate=SAMPLE_RATE,
+        return_tensors="pt"
+    )
+
+    # Move features to device
+    features = {k: v.to(whisper_device) for k, v in features.items()}
+
+    # Generate transcriptions for the whole batch
+    with torch.no_grad():
+        predicted_ids = whisper_model.generate(
+            features["input_features"],
+            max_length=WHISPER_MAX_LENGTH
         )
 
-        # Move features to device
-        features = {k: v.to(device) for k, v in features.items()}
-
-        # Generate transcription
-        with torch.no_grad():
-            predicted_ids = whisper_model.generate(
-                features["input_features"],
-                max_length=225
-            )
-
-            # Decode the output
-            transcription = processor.batch_decode(
-                predicted_ids,
-                skip_special_tokens=True
-            )[0].strip()
+        # Decode the outputs
+        decoded = processor.batch_decode(
+            predicted_ids,
+            skip_special_tokens=True
+        )
 
-            transcriptions.append(transcription)
+    return [transcription.strip() for transcription in decoded]
+
+def words_from_tokens(token_ids, token_times, tokenizer):
+    """Group Whisper tokens into {"word", "start", "end"} (seconds from the window start)"""
+    special_ids = set(tokenizer.all_special_ids)
+    words = []
+    for token_id, token_time in zip(token_ids, token_times):
+        token_time = float(token_time)
+        if token_id in special_ids:
+            # The token after a word marks where it ends
+            if words and words[-1]["end"] is None:
+                words[-1]["end"] = token_time
+            continue
+
+        piece = tokenizer.decode([token_id])
+        if not words or piece.startswith(" "):
+            if words and words[-1]["end"] is None:
+                words[-1]["end"] = token_time
+            words.append({"word": piece.strip(), "start": token_time, "end": None})
+        else:
+            words[-1]["word"] += piece
+
+    for word in words:
+        if word["end"] is None:
+            word["end"] = word["start"]
+    return [word for word in words if word["word"]]
+
+def transcribe_batch_with_words(batch_samples):
+    """Like transcribe_batch, but returns (text, words) with per-word timestamps"""
+    torch = import_backend("torch")
+    load_whisper_model()
+
+    features = processor(batch_samples, sampling_rate=SAMPLE_RATE, return_tensors="pt")
+    features = {k: v.to(whisper_device) for k, v in features.items()}
+
+    with torch.no_grad():
+        outputs = whisper_model.generate(
+            features["input_features"],
+            max_length=WHISPER_MAX_LENGTH,
+            return_token_timestamps=True,
+            return_dict_in_generate=True
+        )
 
+    sequences = outputs["sequences"].cpu()
+    token_timestamps = outputs["token_timestamps"].cpu()
+    decoded = processor.batch_decode(sequences, skip_special_tokens=True)
+    return [(text.strip(), words_from_tokens(ids.tolist(), times.tolist(), processor.tokenizer))
+            for text, ids, times in zip(decoded, sequences, token_timestamps)]
+
+def plan_batches(segments, batch_size=WHISPER_BATCH_SIZE, max_batch_tokens=WHISPER_MAX_BATCH_TOKENS,
+                 overlapped=None):
+    """Whisper batches of segment indices, ordered by their first segment.
+
+    With overlapped flags, clean and overlapped segments never share a batch,
+    so crosstalk doesn't change how clean speech is decoded.
+    """
+    if overlapped is None or not any(overlapped):
+        return list(batch_segments(segments, batch_size, max_batch_tokens))
+
+    batches = []
+    for flag in (False, True):
+        indices = [index for index, is_overlapped in enumerate(overlapped) if is_overlapped == flag]
+        batches.extend([indices[position] for position in batch] for batch in
+                       batch_segments([segments[index] for index in indices], batch_size, max_batch_tokens))
+    return sorted(batches, key=lambda batch: batch[0])
+
+def iter_batch_results(segments, batches, audio, word_timestamps=False):
+    """Yield (batch, transcriptions) for each batch, in the order given"""
+    transcribe = transcribe_batch_with_words if word_timestamps else transcribe_batch
+
+    if WHISPER_WORKERS <= 1:
+        for batch in batches:
+            decoded = transcribe(prepare_batch_samples(segments, batch, audio))
+            logging.info(f"Transcribed batch of {len(batch)} segments")
+            yield batch, decoded
+        return
+
+    # Keep a bounded window of batches in flight across the worker pool and
+    # collect them in submission order
+    pool = get_whisper_pool()
+    pending = deque()
+    for batch in batches:
+        pending.append((batch, pool.submit(transcribe, prepare_batch_samples(segments, batch, audio))))
+        if len(pending) >= WHISPER_WORKERS * 2:
+            batch, future = pending.popleft()
+            yield batch, future.result()
+
+    while pending:
+        batch, future = pending.popleft()
+        yield batch, future.result()
+
+def iter_whisper_transcriptions(segments, audio, batch_size=WHISPER_BATCH_SIZE,
+                                max_batch_tokens=WHISPER_MAX_BATCH_TOKENS, overlapped=None, word_timestamps=False):
+    """Yield (segment_index, transcription) in timeline order as each batch finishes.
+
+    With word_timestamps, each transcription is a (text, words) pair.
+    """
+    batches = plan_batches(segments, batch_size, max_batch_tokens, overlapped)
+
+    # Map the outputs back to their segments and release them in timeline
+    # order; batches start in timeline order, so only a few results wait here
+    ready = {}
+    next_index = 0
+    for batch, decoded in iter_batch_results(segments, batches, audio, word_timestamps):
+        ready.update(zip(batch, decoded))
+        while next_index in ready:
+            yield next_index, ready.pop(next_index)
+            next_index += 1
+
+def transcribe_with_whisper(segments, audio, batch_size=WHISPER_BATCH_SIZE,
+                            max_batch_tokens=WHISPER_MAX_BATCH_TOKENS):
+    transcriptions = [""] * len(segments)
+    for index, transcription in iter_whisper_transcriptions(segments, audio, batch_size, max_batch_tokens):
+        transcriptions[index] = transcription
     return transcriptions
 
-def post_process_transcript(text, patterns, processor):
-    processed_text = text.lower()
-
-    # Apply academic patterns first
-    for pattern, replacement in patterns.items():
-        processed_text = re.sub(pattern, replacement, processed_text, flags=re.IGNORECASE)
+SENTENCE_START_PATTERN = re.compile(r'([.!?]\s+)([a-z])')
+SENTENCE_SPLIT_PATTERN = re.compile(r'([.!?]+)')
 
-    # Apply Filipino corrections
-    for pattern, replacement in processor.filipino_corrections.items():
-        processed_text = re.sub(pattern, replacement, processed_text, flags=re.IGNORECASE)
+def post_process_transcript(text, processor):
+    processed_text = text.lower()
 
-    # Apply time format corrections
-    for pattern, replacement in processor.time_formats.items():
-        processed_text = re.sub(pattern, replacement, processed_text, flags=re.IGNORECASE)
+    # Apply academic terms, then Filipino and time format corrections
+    processed_text = processor.get_correction_engine().apply(processed_text)
 
     # Clean up spacing
     processed_text = ' '.join(processed_text.split())
 
     # Fix capitalization after sentence endings
-    processed_text = re.sub(r'([.!?]\s+)([a-z])', lambda m: m.group(1) + m.group(2).upper(), processed_text)
+    processed_text = SENTENCE_START_PATTERN.sub(lambda m: m.group(1) + m.group(2).upper(), processed_text)
 
     # Capitalize sentences
-    sentences = re.split(r'([.!?]+)', processed_text)
+    sentences = SENTENCE_SPLIT_PATTERN.split(processed_text)
     processed_text = ''.join(s.capitalize() if i % 2 == 0 and s.strip() else s
                             for i, s in enumerate(sentences))
 
     return processed_text
 
-def create_transcript_with_speaker_labels(audio_file):
-    try:
-        logging.info(f"Starting transcript creation for file: {audio_file}")
-
-        # Verify file exists
-        if not os.path.exists(audio_file):
-            raise FileNotFoundError(f"Audio file not found: {audio_file}")
-
-        # Log file details
-        logging.info(f"File size: {os.path.getsize(audio_file)} bytes")
-
-        # Segment audio
-        logging.info("Starting VAD segmentation...")
-        segments = segment_audio_by_vad(audio_file)
-        logging.info(f"Found {len(segments)} segments")
-
-        logging.info("Detecting overlapping speech...")
-        overlapping_segments = detect_overlapping_speech(audio_file)
-        logging.info(f"Found {len(overlapping_segments)} overlapping segments")
-
-        non_overlapping_segments = filter_non_overlapping_segments(segments, overlapping_segments)
-        logging.info(f"Processing {len(non_overlapping_segments)} non-overlapping segments")
-
-        if len(non_overlapping_segments) == 0:
-            raise ValueError("No valid segments found in audio")
-
-        with ThreadPoolExecutor() as executor:
+def iter_transcript_segments(audio_file, on_progress=None, audio_hash=None, metrics=None, merge_windows=True):
+    """Yield each segment as soon as it is transcribed.
+
+    Segments are dicts of start, end, speaker, confidence, text, overlap
+    (transcribed from overlapped speech), regions (the source speech spans
+    the window covers) and, with WORD_TIMESTAMPS, words with absolute times.
+    on_progress, if given, is called as on_progress(progress, status) using the
+    AudioService.update_progress protocol. audio_hash is the SHA-256 of the
+    file when the caller already computed it (e.g. while receiving the upload).
+    Stage timings are recorded into metrics, a PipelineMetrics, when given.
+    With merge_windows=False, same-speaker pieces are not merged (see
+    PLAN_SEGMENTS), so transcription starts without waiting for speakers.
+    """
+    # Intermediate audio files for this job live in a scratch directory that
+    # is removed once the generator finishes
+    with tempfile.TemporaryDirectory(prefix="process_audio_", ignore_cleanup_errors=True) as work_dir:
+        yield from _iter_transcript_segments(audio_file, work_dir, on_progress, audio_hash,
+                                             metrics if metrics is not None else PipelineMetrics(), merge_windows)
+
+def _iter_transcript_segments(audio_file, work_dir, on_progress, audio_hash, metrics, merge_windows):
+    def report(progress, status):
+        if on_progress is not None:
+            on_progress(progress, status)
+
+    logging.info(f"Starting transcript creation for file: {audio_file}")
+    report(0, "Checking cached results")
+
+    # Verify file exists
+    if not os.path.exists(audio_file):
+        raise FileNotFoundError(f"Audio file not found: {audio_file}")
+
+    # Log file details
+    logging.info(f"File size: {os.path.getsize(audio_file)} bytes")
+
+    if result_cache is not None and audio_hash is None:
+        with metrics.stage("hash"):
+            audio_hash = hash_file(audio_file)
+    decoded = {}
+
+    def get_audio():
+        # Decode once and share the buffer between segmentation, speaker prediction and transcription
+        if "audio" not in decoded:
+            report(5, "Decoding audio")
+            logging.info("Decoding audio...")
+            with metrics.stage("decode"):
+                decoded["audio"] = load_audio(audio_file, work_dir)
+            metrics.audio_seconds = len(decoded["audio"]) / SAMPLE_RATE
+            logging.info(f"Decoded {len(decoded['audio']) / SAMPLE_RATE:.1f} seconds of audio")
+        return decoded["audio"]
+
+    def cache_key(stage, config):
+        return result_cache.make_key(audio_hash, stage, config) if result_cache is not None else None
+
+    def cache_get(key):
+        return result_cache.get(key) if key is not None else None
+
+    def cache_put(key, value):
+        if key is not None:
+            result_cache.put(key, value)
+
+    models_ready = False
+
+    def ensure_models():
+        # Only a cache miss needs the models; load_models is a no-op once they are warm
+        nonlocal models_ready
+        if not models_ready:
+            with metrics.stage("load_models"):
+                load_models()
+                refresh_speaker_enrollment()
+            models_ready = True
+
+    # Speech and overlapped speech come from the same segmentation pass
+    report(15, "Detecting speech and overlapping speech")
+    segmentation_key = cache_key("segmentation", segmentation_cache_config())
+    segmentation = cache_get(segmentation_key)
+    if segmentation is None:
+        ensure_models()
+        logging.info("Starting segmentation...")
+        audio = get_audio()
+        with metrics.stage("segmentation"):
+            segments, overlapping_segments = segment_speech_and_overlap(audio)
+        segmentation = {
+            "segments": [(float(start), float(end)) for start, end in segments],
+            "overlaps": [(float(start), float(end)) for start, end in overlapping_segments],
+            "duration": len(audio) / SAMPLE_RATE
+        }
+        # The fixed-length fallback segmentation is not cached
+        if segmentation_inference is not None:
+            cache_put(segmentation_key, segmentation)
+    else:
+        metrics.mark_cached("segmentation")
+        # Entries written before the duration was recorded leave it unknown
+        metrics.audio_seconds = segmentation.get("duration")
+    segments = [tuple(segment) for segment in segmentation["segments"]]
+    overlapping_segments = [tuple(segment) for segment in segmentation["overlaps"]]
+    logging.info(f"Found {len(segments)} segments")
+    logging.info(f"Found {len(overlapping_segments)} overlapping segments")
+
+    with metrics.stage("overlap_filter"):
+        pieces = plan_overlap_handling(segments, overlapping_segments,
+                                       min_duration=VAD_PARAMS["min_duration_on"])
+    if PLAN_SEGMENTS:
+        # Long pieces are cut at quiet points, which needs the audio, so the
+        # cuts are cached and a full cache hit still decodes nothing
+        split_key = cache_key("segment_split", segment_split_cache_config(pieces))
+        split_pieces = cache_get(split_key)
+        if split_pieces is None:
+            with metrics.stage("segment_split", items=len(pieces)):
+                split_pieces = split_long_pieces(pieces, get_audio)
+            cache_put(split_key, [(float(start), float(end), bool(flag)) for start, end, flag in split_pieces])
+        else:
+            metrics.mark_cached("segment_split")
+        pieces = [tuple(piece) for piece in split_pieces]
+
+    # Speakers are predicted per piece, before pieces are merged into
+    # windows, so each embedding covers one voice. Overlapped speech mixes
+    # voices, so only clean pieces are used for speakers
+    speaker_segments = [(start, end) for start, end, flag in pieces if not flag]
+    # Index into the speaker predictions for each clean piece
+    speaker_positions = []
+    clean_count = 0
+    for _, _, flag in pieces:
+        speaker_positions.append(None if flag else clean_count)
+        clean_count += not flag
+    logging.info(f"Processing {len(speaker_segments)} non-overlapping and "
+                 f"{len(pieces) - len(speaker_segments)} overlapped segments ({OVERLAP_MODE})")
+
+    if len(pieces) == 0:
+        raise ValueError("No valid segments found in audio")
+
+    def prepare_audio():
+        if "clean" not in decoded:
+            report(25, "Reducing noise" if DENOISE else "Preparing audio")
+            audio = get_audio()
+            with metrics.stage("denoise" if DENOISE else "preprocess"):
+                decoded["clean"] = preprocess_audio(audio, segments, work_dir=work_dir)
+
+    speaker_key = cache_key("speakers", speaker_cache_config(speaker_segments))
+    embedding_key = cache_key("embeddings", embedding_cache_config(speaker_segments))
+    speakers = cache_get(speaker_key)
+    if speakers is None:
+        ensure_models()
+        prepare_audio()
+
+    def compute_speakers():
+        cacheable = speakers_cacheable()
+        with metrics.stage("speaker_prediction", items=len(speaker_segments)):
+            predictions = [(speaker, float(confidence)) for speaker, confidence
+                           in predict_speaker_for_segments(speaker_segments, decoded["clean"], class_names,
+                                                           embedding_key if cacheable else None)]
+        if cacheable:
+            cache_put(speaker_key, predictions)
+        return predictions
+
+    # Speaker prediction runs alongside transcription; results are paired
+    # with each segment as its Whisper batch finishes. Merging pieces into
+    # windows needs the speakers first, so then transcription waits for them
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        speaker_future = None
+        if speakers is None:
             logging.info("Starting speaker prediction...")
-            speaker_futures = executor.submit(predict_speaker_for_segments,
-                                           non_overlapping_segments,
-                                           audio_file,
-                                           class_names)
-
+            speaker_future = executor.submit(compute_speakers)
+        else:
+            metrics.mark_cached("speaker_prediction")
+
+        if PLAN_SEGMENTS and merge_windows:
+            if speakers is None:
+                with metrics.stage("speaker_wait"):
+                    speakers = speaker_future.result()
+            labels = [speakers[position][0] if position is not None else None for position in speaker_positions]
+            with metrics.stage("segment_planning", items=len(pieces)):
+                windows = merge_pieces(pieces, labels)
+            logging.info(f"Planned {len(windows)} windows from {len(pieces)} segments")
+        else:
+            windows = [[index] for index in range(len(pieces))]
+
+        transcription_segments = [(pieces[window[0]][0], pieces[window[-1]][1]) for window in windows]
+        overlapped = [pieces[window[0]][2] for window in windows]
+        transcription_key = cache_key("transcriptions", transcription_cache_config(transcription_segments))
+        cached_transcriptions = cache_get(transcription_key)
+        if cached_transcriptions is None:
+            ensure_models()
+            prepare_audio()
+
+        total = len(transcription_segments)
+        report(30, f"Transcribing {total} segments")
+
+        if cached_transcriptions is not None:
+            metrics.mark_cached("whisper")
+            transcriptions = enumerate(cached_transcriptions)
+        else:
             logging.info("Starting transcription...")
-            transcription_futures = executor.submit(transcribe_with_whisper,
-                                                  non_overlapping_segments,
-                                                  audio_file)
-
-            speakers = speaker_futures.result()
-            transcriptions = transcription_futures.result()
-
-        logging.info(f"Got {len(speakers)} speaker predictions and {len(transcriptions)} transcriptions")
-
-        # Validate results
-        if not speakers or not transcriptions:
-            raise ValueError("Failed to get speakers or transcriptions")
-
-        combined_transcript = []
-        previous_speaker = None
-        combined_text = ""
-
-        for (speaker, confidence), text in zip(speakers, transcriptions):
-            logging.info(f"Processing segment - Speaker: {speaker} (conf: {confidence:.2f}), Text: {text[:50]}...")
-
-            if not text.strip():
-                continue
+            # Each step waits on at most one Whisper batch, so the stage time
+            # is the time spent generating (or waiting on the worker pool)
+            transcriptions = metrics.timed_iter(
+                "whisper", iter_whisper_transcriptions(transcription_segments, decoded["clean"],
+                                                       overlapped=overlapped, word_timestamps=WORD_TIMESTAMPS)
+            )
 
-            if speaker == previous_speaker:
-                combined_text += " " + text
+        # Raw Whisper output is cached, so post-processing changes reuse it
+        raw_transcriptions = []
+        completed = 0
+        for index, transcription in transcriptions:
+            if speakers is None:
+                with metrics.stage("speaker_wait"):
+                    speakers = speaker_future.result()
+                logging.info(f"Got {len(speakers)} speaker predictions")
+            if speaker_segments and not speakers:
+                raise ValueError("Failed to get speakers or transcriptions")
+
+            raw_transcriptions.append(transcription)
+            text, words = transcription if WORD_TIMESTAMPS else (transcription, None)
+            # Source speech regions covered by the window, all of one speaker
+            regions = [pieces[piece][:2] for piece in windows[index]]
+            positions = [speaker_positions[piece] for piece in windows[index]]
+            start, end = transcription_segments[index]
+            if overlapped[index]:
+                # Overlapped speech mixes voices, so it gets no speaker or confidence
+                speaker, confidence = None, None
+                logging.info(f"Processing overlapped segment, Text: {text[:50]}...")
             else:
-                if previous_speaker:
-                    combined_transcript.append(f"{previous_speaker}: {combined_text.strip()}")
-                previous_speaker = speaker
-                combined_text = text
-
-        if previous_speaker:
-            combined_transcript.append(f"{previous_speaker}: {combined_text.strip()}")
+                speaker = speakers[positions[0]][0]
+                # Duration-weighted over the window's regions
+                confidence = (sum(speakers[position][1] * (region_end - region_start)
+                                  for position, (region_start, region_end) in zip(positions, regions))
+                              / max(sum(region_end - region_start for region_start, region_end in regions), 1e-9))
+                logging.info(f"Processing segment - Speaker: {speaker} (conf: {confidence:.2f}), "
+                             f"{len(regions)} regions, Text: {text[:50]}...")
+
+            segment = {
+                "start": float(start),
+                "end": float(end),
+                "speaker": speaker,
+                "confidence": float(confidence) if confidence is not None else None,
+                "text": text,
+                "overlap": overlapped[index],
+                "regions": [[float(region_start), float(region_end)] for region_start, region_end in regions]
+            }
+            if words is not None:
+                # Word times are relative to the window, which starts at the segment start
+                segment["words"] = [{"word": word["word"], "start": start + word["start"], "end": start + word["end"]}
+                                    for word in words]
+            yield segment
+
+            completed += 1
+            report(30 + int(65 * completed / total), f"Transcribed {completed}/{total} segments")
+
+        if cached_transcriptions is None:
+            cache_put(transcription_key, raw_transcriptions)
+
+def transcribe_to_file(audio_file, output_file, on_progress=None, audio_hash=None, metrics=None,
+                       on_segment=None, structured_output=None, merge_windows=True):
+    """Transcribe audio_file into "Speaker: text" lines written to output_file as each turn completes.
+
+    Every segment with text is passed to on_segment, if given, and written
+    to structured_output (a StructuredTranscriptWriter), if given. Returns
+    the TranscriptAssembler, which carries the speakers, line count and
+    duration. merge_windows is passed to iter_transcript_segments.
+    """
+    assembler = TranscriptAssembler(output_file)
+    for segment in iter_transcript_segments(audio_file, on_progress, audio_hash, metrics, merge_windows):
+        if segment["text"].strip():
+            if on_segment is not None:
+                on_segment(segment)
+            if structured_output is not None:
+                structured_output.write(segment)
+        assembler.add(segment["speaker"], segment["text"], segment["start"], segment["end"], segment["overlap"])
+    assembler.close()
+
+    logging.info(f"Final transcript has {assembler.lines} lines")
+    return assembler
+
+def create_transcript_with_speaker_labels(audio_file, on_progress=None, audio_hash=None, metrics=None):
+    """Transcript lines as a list; prefer transcribe_to_file for long recordings"""
+    try:
+        lines = []
+        assembler = TranscriptAssembler(on_turn=lambda turn: lines.append(format_turn(turn)))
+        assembler.add_all((segment["speaker"], segment["text"], segment["start"], segment["end"], segment["overlap"])
+                          for segment in iter_transcript_segments(audio_file, on_progress, audio_hash, metrics))
+        assembler.close()
 
-        logging.info(f"Final transcript has {len(combined_transcript)} lines")
-        return combined_transcript
+        logging.info(f"Final transcript has {len(lines)} lines")
+        return lines
 
     except Exception as e:
         logging.error(f"Error in create_transcript_with_speaker_labels: {str(e)}", exc_info=True)
@@ -453,6 +1539,112 @@ def get_transcript_directory():
 
     return transcript_dir
 
+def validate_input_file(input_audio_path):
+    # Validate input file
+    if not os.path.exists(input_audio_path):
+        raise FileNotFoundError(f"Input file not found: {input_audio_path}")
+
+    # Check file size
+    file_size = os.path.getsize(input_audio_path)
+    logging.info(f"File size: {file_size} bytes")
+
+    # Validate file can be opened
+    try:
+        with open(input_audio_path, 'rb') as f:
+            f.read(1024)  # Try reading first 1KB
+    except Exception as e:
+        raise IOError(f"Cannot read input file: {str(e)}")
+
+def get_output_path(input_audio_path, transcript_dir=None):
+    if transcript_dir is None:
+        transcript_dir = get_transcript_directory()
+    base_name = os.path.splitext(os.path.basename(input_audio_path))[0]
+    return os.path.join(transcript_dir, f"{base_name}_transcript.txt")
+
+def get_segments_path(output_path):
+    """Structured (JSON Lines) transcript stored next to the text transcript"""
+    return os.path.splitext(output_path)[0] + ".jsonl"
+
+def finish_metrics(metrics):
+    """Close a run's metrics, add them to the process-wide totals and return the summary"""
+    metrics.finish()
+    summary = metrics.summary()
+    REGISTRY.observe(summary)
+    logging.info(f"Pipeline metrics: {json.dumps(summary)}")
+    return summary
+
+def process_file(input_audio_path, transcript_dir=None, audio_hash=None):
+    """Transcribe one audio file, save the transcript and return the result payload"""
+    logging.info(f"Processing audio file: {input_audio_path}")
+    validate_input_file(input_audio_path)
+
+    # Setup output paths
+    output_path = get_output_path(input_audio_path, transcript_dir)
+    metrics = PipelineMetrics()
+
+    # Process the audio file, writing the transcript as it is assembled
+    with profile_run(os.path.splitext(os.path.basename(input_audio_path))[0]), \
+            open(output_path, "w", encoding="utf-8") as f, \
+            StructuredTranscriptWriter(get_segments_path(output_path)) as structured_output:
+        assembler = transcribe_to_file(input_audio_path, f, audio_hash=audio_hash, metrics=metrics,
+                                       structured_output=structured_output)
+
+    if not assembler.lines:
+        raise ValueError("No transcript generated")
+
+    # The payload carries the full text, read back once
+    with open(output_path, "r", encoding="utf-8") as f:
+        transcript = f.read()
+
+    return {
+        "status": "success",
+        "data": {
+            "file_path": output_path,
+            "segments_path": structured_output.segments_path,
+            "index_path": structured_output.index_path,
+            "transcript": transcript,
+            "speakers": assembler.speakers,
+            "duration": metrics.audio_seconds or assembler.duration,
+            "metrics": finish_metrics(metrics)
+        }
+    }
+
+def stream_file(input_audio_path, service, transcript_dir=None):
+    """Transcribe one audio file, emitting progress and partial results as segments finish.
+
+    Each speaker turn is appended to the transcript file as soon as it ends,
+    so the full transcript is never held in memory; the final payload carries
+    the file path instead of the transcript text.
+    """
+    logging.info(f"Streaming audio file: {input_audio_path}")
+    validate_input_file(input_audio_path)
+
+    output_path = get_output_path(input_audio_path, transcript_dir)
+    metrics = PipelineMetrics()
+
+    with profile_run(os.path.splitext(os.path.basename(input_audio_path))[0]), \
+            open(output_path, "w", encoding="utf-8") as f, \
+            StructuredTranscriptWriter(get_segments_path(output_path)) as structured_output:
+        assembler = transcribe_to_file(input_audio_path, f, on_progress=service.update_progress,
+                                       metrics=metrics, on_segment=service.emit_partial,
+                                       structured_output=structured_output, merge_windows=False)
+
+    if not assembler.lines:
+        raise ValueError("No transcript generated")
+
+    service.update_progress(100, "Complete")
+    return {
+        "status": "success",
+        "data": {
+            "file_path": output_path,
+            "segments_path": structured_output.segments_path,
+            "index_path": structured_output.index_path,
+            "speakers": assembler.speakers,
+            "duration": metrics.audio_seconds or assembler.duration,
+            "metrics": finish_metrics(metrics)
+        }
+    }
+
 def main():
     # Redirect all stdout to prevent non-JSON output
     original_stdout = sys.stdout
@@ -468,52 +1660,18 @@ def main():
         )
 
         # Validate command line arguments
-        if len(sys.argv) < 2:
+        args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+        if not args:
             raise ValueError("No input file provided")
 
-        input_audio_path = sys.argv[1]
-        logging.info(f"Processing audio file: {input_audio_path}")
-
-        # Validate input file
-        if not os.path.exists(input_audio_path):
-            raise FileNotFoundError(f"Input file not found: {input_audio_path}")
-
-        # Check file size
-        file_size = os.path.getsize(input_audio_path)
-        logging.info(f"File size: {file_size} bytes")
-
-        # Validate file can be opened
-        try:
-            with open(input_audio_path, 'rb') as f:
-                f.read(1024)  # Try reading first 1KB
-        except Exception as e:
-            raise IOError(f"Cannot read input file: {str(e)}")
-
-        # Process the audio file
-        transcript_lines = create_transcript_with_speaker_labels(input_audio_path)
-
-        if not transcript_lines:
-            raise ValueError("No transcript generated")
-
-        # Setup output paths
-        transcript_dir = get_transcript_directory()
-        base_name = os.path.splitext(os.path.basename(input_audio_path))[0]
-        output_path = os.path.join(transcript_dir, f"{base_name}_transcript.txt")
-
-        # Save transcript
-        with open(output_path, "w", encoding="utf-8") as f:
-            f.write("\n".join(transcript_lines))
-
-        # Return success response
-        result = {
-            "status": "success",
-            "data": {
-                "file_path": output_path,
-                "transcript": "\n".join(transcript_lines),
-                "speakers": list(set(line.split(":")[0].strip() for line in transcript_lines)),
-                "duration": 0  # Add actual duration if available
-            }
-        }
+        if "--stream" in sys.argv[1:]:
+            # Newline-delimited JSON progress and partial-result events go to
+            # the real stdout ahead of the final result
+            service = AudioService(stream=original_stdout)
+            result = stream_file(args[0], service)
+        else:
+            # Process the audio file and build the success response
+            result = process_file(args[0])
 
         # Restore stdout for final JSON output
         sys.stdout = original_stdout
@@ -0,0 +1,144 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+# Bump when a change to the pipeline makes previously cached stage results invalid
+CACHE_FORMAT_VERSION = 1
+
+
+def hash_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 of the file contents, read in fixed-size chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """On-disk cache of pipeline stage results keyed by audio content hash.
+
+    Each entry is one JSON file (or .npy file for arrays) named after its
+    stage and a digest of the audio hash plus the stage configuration (model
+    names, parameters, input segments), so changing a later stage never
+    invalidates earlier ones.
+    Entries are evicted least-recently-used first once the cache grows past
+    max_bytes; a cache hit refreshes the entry's modification time.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def make_key(self, audio_hash: str, stage: str, config: Dict[str, Any]) -> str:
+        payload = json.dumps({
+            "version": CACHE_FORMAT_VERSION,
+            "audio": audio_hash,
+            "stage": stage,
+            "config": config
+        }, sort_keys=True)
+        return f"{stage}-{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+    def _path(self, key: str, extension: str = ".json") -> str:
+        return os.path.join(self.cache_dir, f"{key}{extension}")
+
+    def get(self, key: str) -> Optional[Any]:
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                value = json.load(f)
+            os.utime(path)  # Mark as recently used
+            self.logger.info(f"Result cache hit: {key}")
+            return value
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Discarding unreadable cache entry {key}: {e}")
+            self._remove(path)
+            return None
+
+    def put(self, key: str, value: Any):
+        path = self._path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(value, f)
+            os.replace(temp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            self.logger.warning(f"Could not write cache entry {key}: {e}")
+            self._remove(temp_path)
+            return
+        self.evict()
+
+    def get_array(self, key: str) -> Optional[np.ndarray]:
+        path = self._path(key, ".npy")
+        try:
+            value = np.load(path, allow_pickle=False)
+            os.utime(path)  # Mark as recently used
+            self.logger.info(f"Result cache hit: {key}")
+            return value
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Discarding unreadable cache entry {key}: {e}")
+            self._remove(path)
+            return None
+
+    def put_array(self, key: str, value: np.ndarray):
+        path = self._path(key, ".npy")
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, 'wb') as f:
+                np.save(f, value, allow_pickle=False)
+            os.replace(temp_path, path)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Could not write cache entry {key}: {e}")
+            self._remove(temp_path)
+            return
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes."""
+        with self._lock:
+            entries = []
+            total = 0
+            for entry in os.scandir(self.cache_dir):
+                if not entry.name.endswith(('.json', '.npy')):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                self._remove(path)
+                total -= size
+
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def create_default_cache() -> Optional[ResultCache]:
+    """Build the cache from RESULT_CACHE_* environment settings, or None when disabled."""
+    if os.environ.get("RESULT_CACHE", "1") == "0":
+        return None
+
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    cache_dir = os.environ.get("RESULT_CACHE_DIR", os.path.join(project_root, "cache", "results"))
+    max_bytes = int(os.environ.get("RESULT_CACHE_MAX_MB", 512)) * 1024 * 1024
+    return ResultCache(cache_dir, max_bytes)
@@ -0,0 +1,219 @@
+"""Speaker enrollment index: voice prints of known people for nearest-neighbour lookup.
+
+Reference clips live in <source>/<person name>/*.wav (or .flac, .mp3, ...).
+Each clip becomes one L2-normalized embedding row of a float32 matrix that
+is memory-mapped from disk; a JSON sidecar holds the row-to-person mapping
+and the embedding model, so adding a person only means rebuilding the index:
+
+    python speaker_index.py build [--source DATA/audio] [--output DATA/speaker_index]
+    python speaker_index.py info [--output DATA/speaker_index]
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+INDEX_FORMAT_VERSION = 1
+MATRIX_FILE = "embeddings.f32"
+METADATA_FILE = "index.json"
+CLIP_EXTENSIONS = (".wav", ".flac", ".mp3", ".m4a", ".ogg")
+# Clips are embedded this many at a time while building
+BUILD_BATCH_CLIPS = 64
+
+DEFAULT_SOURCE = os.path.join("DATA", "audio")
+DEFAULT_INDEX_DIR = os.environ.get("SPEAKER_INDEX_DIR", os.path.join("DATA", "speaker_index"))
+
+
+def find_reference_clips(source: str) -> List[Tuple[str, str]]:
+    """(person, clip_path) for every reference clip, grouped by person in name order"""
+    clips = []
+    if not os.path.isdir(source):
+        return clips
+    for name in sorted(os.listdir(source)):
+        person_dir = os.path.join(source, name)
+        if not os.path.isdir(person_dir):
+            continue
+        clips.extend((name, os.path.join(person_dir, clip)) for clip in sorted(os.listdir(person_dir))
+                     if os.path.splitext(clip)[1].lower() in CLIP_EXTENSIONS)
+    return clips
+
+
+def clips_fingerprint(clips: Sequence[Tuple[str, str]], model: Optional[str]) -> str:
+    """Cheap identity of a set of reference clips and the embedding model, from file stats only"""
+    digest = hashlib.sha256()
+    for name, path in clips:
+        stat = os.stat(path)
+        digest.update(f"{name}\0{os.path.basename(path)}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode("utf-8"))
+    return f"{model}:{digest.hexdigest()}"
+
+
+class SpeakerIndex:
+    """Read-only enrolled voice prints with batched cosine top-k queries.
+
+    Rows are grouped by person, so per-person scores are a max over each
+    group of the query-by-row similarity matrix.
+    """
+
+    def __init__(self, matrix: np.ndarray, names: Sequence[str], metadata: dict):
+        self.matrix = matrix
+        self.names = list(names)
+        self.metadata = metadata
+        # First row of each person's group
+        self.row_starts = np.asarray(metadata["row_starts"], dtype=np.int64)
+
+    @classmethod
+    def load(cls, directory: str = DEFAULT_INDEX_DIR) -> Optional["SpeakerIndex"]:
+        """Open an index built by build_index, or None if there is none"""
+        metadata_path = os.path.join(directory, METADATA_FILE)
+        if not os.path.exists(metadata_path):
+            return None
+        with open(metadata_path, "r", encoding="utf-8") as f:
+            metadata = json.load(f)
+        if metadata.get("version") != INDEX_FORMAT_VERSION:
+            logging.warning(f"Ignoring speaker index in {directory} with format {metadata.get('version')}")
+            return None
+
+        rows, dimension = metadata["rows"], metadata["dimension"]
+        if rows == 0:
+            matrix = np.zeros((0, dimension), dtype=np.float32)
+        else:
+            matrix = np.memmap(os.path.join(directory, MATRIX_FILE), dtype=np.float32, mode="r",
+                               shape=(rows, dimension))
+        return cls(matrix, metadata["names"], metadata)
+
+    @property
+    def model(self) -> Optional[str]:
+        return self.metadata.get("model")
+
+    @property
+    def fingerprint(self) -> str:
+        """Changes whenever the index is rebuilt with different people or clips"""
+        return self.metadata["fingerprint"]
+
+    def __len__(self):
+        return len(self.names)
+
+    def person_scores(self, queries: np.ndarray) -> np.ndarray:
+        """[queries, people] best cosine similarity between each query and each person's clips"""
+        if len(self.names) == 0:
+            return np.zeros((len(queries), 0), dtype=np.float32)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = (queries / np.maximum(norms, 1e-10)).astype(np.float32)
+        # One matrix multiply for the whole batch of queries
+        scores = queries @ self.matrix.T
+        return np.maximum.reduceat(scores, self.row_starts, axis=1)
+
+    def query(self, queries: np.ndarray, k: int = 1) -> Tuple[List[List[str]], np.ndarray]:
+        """Top-k (names, scores) per query, best first"""
+        scores = self.person_scores(queries)
+        k = min(k, scores.shape[1])
+        if k == 0:
+            return [[] for _ in range(len(queries))], np.zeros((len(queries), 0), dtype=np.float32)
+
+        # Partial selection of the k best, then a sort of just those k
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        return ([[self.names[person] for person in row] for row in top],
+                np.take_along_axis(top_scores, order, axis=1))
+
+
+def build_index(source: str, directory: str, embedder, load_clip: Callable[[str], np.ndarray]) -> SpeakerIndex:
+    """Embed every reference clip under source and write the index to directory.
+
+    The matrix is written to temporary files and swapped in, so readers
+    never see a half-written index.
+    """
+    clips = find_reference_clips(source)
+    # Taken before embedding, so a clip changed while building makes the index stale
+    fingerprint = clips_fingerprint(clips, getattr(embedder, "name", None))
+    os.makedirs(directory, exist_ok=True)
+    matrix_path = os.path.join(directory, MATRIX_FILE)
+    metadata_path = os.path.join(directory, METADATA_FILE)
+    temp_suffix = f".{os.getpid()}.tmp"
+
+    names = []
+    row_starts = []
+    dimension = None
+    with open(matrix_path + temp_suffix, "wb") as f:
+        for batch_start in range(0, len(clips), BUILD_BATCH_CLIPS):
+            batch = clips[batch_start:batch_start + BUILD_BATCH_CLIPS]
+            embeddings = embedder.embed([load_clip(path) for _, path in batch]).astype(np.float32)
+            embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-10)
+            dimension = embeddings.shape[1]
+            f.write(embeddings.tobytes())
+
+            for offset, (name, path) in enumerate(batch):
+                if not names or names[-1] != name:
+                    names.append(name)
+                    row_starts.append(batch_start + offset)
+            logging.info(f"Embedded {batch_start + len(batch)}/{len(clips)} reference clips")
+
+    metadata = {
+        "version": INDEX_FORMAT_VERSION,
+        "model": getattr(embedder, "name", None),
+        "dimension": dimension or 0,
+        "rows": len(clips),
+        "names": names,
+        "row_starts": row_starts,
+        "fingerprint": fingerprint,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S")
+    }
+    with open(metadata_path + temp_suffix, "w", encoding="utf-8") as f:
+        json.dump(metadata, f, indent=2)
+
+    # Matrix first: an old sidecar over a new matrix is caught by the row count
+    os.replace(matrix_path + temp_suffix, matrix_path)
+    os.replace(metadata_path + temp_suffix, metadata_path)
+    logging.info(f"Built speaker index of {len(names)} people from {len(clips)} clips in {directory}")
+    return SpeakerIndex.load(directory)
+
+
+def load_or_build_index(source: str, directory: str, embedder,
+                        load_clip: Callable[[str], np.ndarray]) -> Optional[SpeakerIndex]:
+    """The index in directory, rebuilt when it is missing or its clips or embedding model changed.
+
+    The reference clips are compared by name, size and modification time
+    only, so checking an up-to-date index never reads any audio.
+    """
+    index = SpeakerIndex.load(directory)
+    clips = find_reference_clips(source)
+    if index is not None and index.fingerprint == clips_fingerprint(clips, getattr(embedder, "name", None)):
+        return index
+    if not clips:
+        return None
+    logging.info(f"Speaker index in {directory} is missing or stale, rebuilding")
+    return build_index(source, directory, embedder, load_clip)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["build", "info"])
+    parser.add_argument("--source", default=DEFAULT_SOURCE, help="Directory of <person>/<clip> reference audio")
+    parser.add_argument("--output", default=DEFAULT_INDEX_DIR, help="Index directory")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.command == "build":
+        # The pipeline's embedder, so queries and the index share a model
+        import process_audio
+        embedder = process_audio.load_speaker_embedder()
+        index = build_index(args.source, args.output, embedder, process_audio.load_audio)
+    else:
+        index = SpeakerIndex.load(args.output)
+        if index is None:
+            print(f"No speaker index in {args.output}", file=sys.stderr)
+            sys.exit(1)
+
+    print(json.dumps({key: value for key, value in index.metadata.items() if key != "row_starts"}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# The pipeline modules are flat scripts in the parent directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep test runs out of the on-disk result and translation caches
+os.environ.setdefault("RESULT_CACHE", "0")
+os.environ.setdefault("TRANSLATION_CACHE", "0")
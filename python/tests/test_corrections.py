@@ -0,0 +1,71 @@
+import random
+import re
+
+import pytest
+
+import process_audio
+
+
+def sequential_corrections(text, processor):
+    """The original corrections: one re.sub per term pattern and correction rule"""
+    for pattern, replacement in processor.create_term_patterns().items():
+        text = re.sub(pattern, replacement, text, flags=re.IGNORECASE)
+    for pattern, replacement in processor.filipino_corrections.items():
+        text = re.sub(pattern, replacement, text, flags=re.IGNORECASE)
+    for pattern, replacement in processor.time_formats.items():
+        text = re.sub(pattern, replacement, text, flags=re.IGNORECASE)
+    return text
+
+
+def sequential_post_process(text, processor):
+    """The original post-processing around the sequential corrections"""
+    processed_text = sequential_corrections(text.lower(), processor)
+    processed_text = ' '.join(processed_text.split())
+    processed_text = re.sub(r'([.!?]\s+)([a-z])', lambda m: m.group(1) + m.group(2).upper(), processed_text)
+    sentences = re.split(r'([.!?]+)', processed_text)
+    return ''.join(s.capitalize() if i % 2 == 0 and s.strip() else s for i, s in enumerate(sentences))
+
+
+@pytest.fixture(scope="module")
+def processor():
+    return process_audio.TranscriptionProcessor()
+
+
+def vocabulary(processor):
+    terms = set().union(processor.academic_roles, processor.academic_terms,
+                        processor.departments, processor.known_names)
+    words = [term.lower() for term in terms]
+    words += [part.lower() for term in terms for part in term.split()]
+    words += ["di tanong", "studyante", "wla", "sna", "pra", "ung", "kht", "mga tao", "pag may", "sa mga"]
+    words += ["9 am", "930 am", "10 p m", "1045 pm", "7 a m"]
+    words += ["the", "meeting", "ang", "ng", "itisation", "deanship", "ccs2", "mitigate", "ipcrs"]
+    return words
+
+
+def random_text(processor, seed):
+    rng = random.Random(seed)
+    words = vocabulary(processor)
+    return " ".join(rng.choice(words) + rng.choice(["", "", "", ".", ",", "?", "!"])
+                    for _ in range(rng.randint(1, 40)))
+
+
+@pytest.mark.parametrize("seed", range(300))
+def test_engine_matches_sequential_substitution(processor, seed):
+    text = random_text(processor, seed).lower()
+    assert processor.get_correction_engine().apply(text) == sequential_corrections(text, processor)
+
+
+@pytest.mark.parametrize("seed", range(100))
+def test_post_process_matches_original(processor, seed):
+    text = random_text(processor, seed)
+    assert process_audio.post_process_transcript(text, processor) == sequential_post_process(text, processor)
+
+
+def test_engine_is_rebuilt_after_invalidation(processor):
+    processor.known_names.add("Ada Lovelace")
+    try:
+        processor.invalidate_corrections()
+        assert processor.get_correction_engine().apply("ada lovelace spoke") == "Ada Lovelace spoke"
+    finally:
+        processor.known_names.discard("Ada Lovelace")
+        processor.invalidate_corrections()
@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("scipy")
+
+import diarization
+from speaker_index import SpeakerIndex
+
+DIMENSION = 32
+
+
+def voices(count, seed=0):
+    """Well separated unit voice prints, one per speaker"""
+    rng = np.random.default_rng(seed)
+    basis, _ = np.linalg.qr(rng.normal(size=(DIMENSION, DIMENSION)))
+    return basis[:count].astype(np.float32)
+
+
+def segments_of(voice_prints, speakers, seed=0, spread=0.05):
+    rng = np.random.default_rng(seed)
+    return np.stack([voice_prints[speaker] + rng.normal(0, spread, DIMENSION) for speaker in speakers]).astype(np.float32)
+
+
+def enrollment(voice_prints, names, clips_per_person=2, seed=1):
+    rng = np.random.default_rng(seed)
+    rows = [voice_prints[person] + rng.normal(0, 0.05, DIMENSION)
+            for person in range(len(names)) for _ in range(clips_per_person)]
+    matrix = diarization.l2_normalize(np.stack(rows).astype(np.float32))
+    row_starts = list(range(0, len(rows), clips_per_person))
+    return SpeakerIndex(matrix, names, {"row_starts": row_starts})
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_clusters_are_numbered_by_first_appearance(seed):
+    speakers = [2, 2, 0, 1, 0, 2, 1, 3, 3, 0]
+    embeddings = segments_of(voices(4, seed), speakers, seed)
+
+    labels = diarization.cluster_embeddings(embeddings)
+
+    # Speaker 2 talks first, then 0, then 1, then 3
+    assert labels.tolist() == [0, 0, 1, 2, 1, 0, 2, 3, 3, 1]
+
+
+def test_requested_speaker_count_is_used():
+    embeddings = segments_of(voices(3), [0, 1, 2, 0, 1, 2])
+
+    assert diarization.cluster_embeddings(embeddings, num_speakers=3).tolist() == [0, 1, 2, 0, 1, 2]
+    assert len(set(diarization.cluster_embeddings(embeddings, num_speakers=2).tolist())) == 2
+
+
+def test_trivial_inputs_need_no_clustering():
+    assert diarization.cluster_embeddings(np.zeros((0, DIMENSION), dtype=np.float32)).tolist() == []
+    assert diarization.cluster_embeddings(voices(1)).tolist() == [0]
+    assert diarization.assign_speakers(np.zeros((0, DIMENSION), dtype=np.float32)) == []
+
+
+def test_anonymous_speakers_are_labelled_in_order_of_appearance():
+    embeddings = segments_of(voices(3), [1, 1, 2, 0, 2])
+
+    assigned = diarization.assign_speakers(embeddings)
+
+    assert [label for label, _ in assigned] == ["Speaker 1", "Speaker 1", "Speaker 2", "Speaker 3", "Speaker 2"]
+    assert all(confidence > 0.9 for _, confidence in assigned)
+
+
+def test_enrolled_clusters_take_the_persons_name():
+    voice_prints = voices(4)
+    index = enrollment(voice_prints[:2], ["Alice", "Bob"])
+    embeddings = segments_of(voice_prints, [3, 0, 1, 3, 0, 2])
+
+    assigned = diarization.assign_speakers(embeddings, index)
+
+    assert [label for label, _ in assigned] == ["Speaker 1", "Alice", "Bob", "Speaker 1", "Alice", "Speaker 2"]
+
+
+def test_each_person_is_matched_to_one_cluster_at_most():
+    voice_prints = voices(3)
+    index = enrollment(voice_prints[:1], ["Alice"])
+    # Two clusters close to Alice's voice; only the closer one gets her name
+    centroids = diarization.l2_normalize(np.stack([
+        voice_prints[0] + 0.3 * voice_prints[1],
+        voice_prints[0] + 0.1 * voice_prints[2],
+        voice_prints[2]
+    ]).astype(np.float32))
+
+    assert diarization.match_clusters(centroids, index) == [None, "Alice", None]
+
+
+def test_clusters_below_the_match_threshold_stay_anonymous():
+    voice_prints = voices(3)
+    index = enrollment(voice_prints[:2], ["Alice", "Bob"])
+    centroids = diarization.l2_normalize(voice_prints[2:3])
+
+    assert diarization.match_clusters(centroids, index) == [None]
+    empty = SpeakerIndex(np.zeros((0, DIMENSION), dtype=np.float32), [], {"row_starts": []})
+    assert diarization.match_clusters(centroids, empty) == [None]
@@ -0,0 +1,194 @@
+import hashlib
+import io
+import os
+import stat
+import threading
+
+import pytest
+
+pytest.importorskip("flask")
+
+from job_queue import JobQueue, JobStore, QueueFullError
+
+
+@pytest.fixture(scope="module")
+def app_module(tmp_path_factory):
+    # flask_app opens its job store and log file at import
+    directory = tmp_path_factory.mktemp("flask_app")
+    cwd = os.getcwd()
+    os.environ["JOB_STORE_PATH"] = str(directory / "jobs.sqlite3")
+    os.chdir(directory)
+    try:
+        import flask_app
+    finally:
+        os.chdir(cwd)
+        del os.environ["JOB_STORE_PATH"]
+    return flask_app
+
+
+@pytest.fixture
+def upload_dir(app_module, tmp_path, monkeypatch):
+    directory = tmp_path / "uploads"
+    directory.mkdir()
+    monkeypatch.setitem(app_module.app.config, "UPLOAD_FOLDER", str(directory))
+    return directory
+
+
+@pytest.fixture
+def shared_dir(app_module, tmp_path, monkeypatch):
+    directory = tmp_path / "shared"
+    directory.mkdir()
+    monkeypatch.setattr(app_module, "SHARED_UPLOAD_ROOTS", [os.path.realpath(directory)])
+    return directory
+
+
+@pytest.fixture
+def submitted(app_module, tmp_path, monkeypatch):
+    """Swap in a one-slot job queue whose jobs block until released; returns the submitted jobs"""
+    jobs = []
+    release = threading.Event()
+
+    def handler(file_path, audio_hash):
+        jobs.append((file_path, audio_hash))
+        release.wait(5)
+        return {}
+
+    queue = JobQueue(JobStore(str(tmp_path / "jobs.sqlite3")), handler, max_workers=1, max_pending=0)
+    monkeypatch.setattr(app_module, "job_queue", queue)
+    yield jobs
+    release.set()
+
+
+@pytest.fixture
+def client(app_module, upload_dir):
+    return app_module.app.test_client()
+
+
+def post_raw(client, body=b"RIFF audio", filename="meeting.wav"):
+    return client.post("/jobs", data=body, headers={"X-Filename": filename},
+                       content_type="application/octet-stream")
+
+
+def test_full_queue_is_refused_before_the_upload(client, upload_dir, submitted, app_module):
+    assert post_raw(client).status_code == 202
+    assert len(os.listdir(upload_dir)) == 1
+
+    response = post_raw(client)
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "30"
+    assert len(os.listdir(upload_dir)) == 1
+
+
+def test_upload_is_removed_when_the_queue_fills_meanwhile(client, upload_dir, app_module, monkeypatch):
+    def submit(file_path, audio_hash=None):
+        raise QueueFullError("Job queue is full (1 jobs)")
+
+    monkeypatch.setattr(app_module.job_queue, "has_capacity", lambda: True)
+    monkeypatch.setattr(app_module.job_queue, "submit", submit)
+
+    response = client.post("/jobs", data={"file": (io.BytesIO(b"RIFF audio"), "meeting.wav")},
+                           content_type="multipart/form-data")
+
+    assert response.status_code == 503
+    assert os.listdir(upload_dir) == []
+
+
+def test_shared_file_is_kept_when_the_queue_is_full(client, shared_dir, app_module, monkeypatch):
+    shared_file = shared_dir / "meeting.wav"
+    shared_file.write_bytes(b"RIFF audio")
+
+    def submit(file_path, audio_hash=None):
+        raise QueueFullError("Job queue is full (1 jobs)")
+
+    monkeypatch.setattr(app_module.job_queue, "has_capacity", lambda: True)
+    monkeypatch.setattr(app_module.job_queue, "submit", submit)
+
+    response = client.post("/jobs", json={"file_path": str(shared_file)})
+
+    assert response.status_code == 503
+    assert shared_file.exists()
+
+
+def only_upload(upload_dir):
+    files = os.listdir(upload_dir)
+    assert len(files) == 1
+    return upload_dir / files[0]
+
+
+def submitted_job(app_module, response):
+    assert response.status_code == 202
+    return app_module.job_queue.store.get(response.get_json()["data"]["job_id"])
+
+
+def test_multipart_upload_is_hashed_and_extra_parts_are_removed(client, upload_dir, submitted, app_module):
+    audio = os.urandom(3 * 2 ** 20 + 17)
+    response = client.post("/jobs", data={
+        "file": (io.BytesIO(audio), "team meeting.wav"),
+        "attachment": (io.BytesIO(b"notes"), "notes.txt")
+    }, content_type="multipart/form-data")
+
+    job = submitted_job(app_module, response)
+    upload = only_upload(upload_dir)
+    assert upload.name.endswith("_team_meeting.wav")
+    assert job["file_path"] == str(upload)
+    assert job["audio_hash"] == hashlib.sha256(audio).hexdigest()
+    assert upload.read_bytes() == audio
+    # Sealed, since the hash is trusted when the job runs
+    assert stat.S_IMODE(upload.stat().st_mode) == 0o444
+
+
+@pytest.mark.parametrize("data", [
+    {"file": (io.BytesIO(b"RIFF audio"), "")},
+    {"attachment": (io.BytesIO(b"RIFF audio"), "meeting.wav")},
+])
+def test_multipart_without_a_named_file_is_rejected(client, upload_dir, submitted, data):
+    response = client.post("/jobs", data=data, content_type="multipart/form-data")
+
+    assert response.status_code == 400
+    assert os.listdir(upload_dir) == []
+    assert submitted == []
+
+
+def test_raw_body_is_stored_under_its_header_name(client, upload_dir, submitted, app_module):
+    audio = os.urandom(2 * 2 ** 20 + 5)
+
+    job = submitted_job(app_module, post_raw(client, audio, filename="../evening call.mp3"))
+
+    upload = only_upload(upload_dir)
+    assert upload.name.endswith("_evening_call.mp3")
+    assert job["audio_hash"] == hashlib.sha256(audio).hexdigest()
+    assert upload.read_bytes() == audio
+
+
+def test_raw_body_without_a_name_is_rejected(client, upload_dir, submitted):
+    response = client.post("/jobs", data=b"RIFF audio", content_type="application/octet-stream")
+
+    assert response.status_code == 400
+    assert os.listdir(upload_dir) == []
+
+
+def test_shared_path_is_used_in_place(client, upload_dir, shared_dir, submitted, app_module):
+    shared_file = shared_dir / "meeting.wav"
+    shared_file.write_bytes(b"RIFF audio")
+
+    job = submitted_job(app_module, client.post("/jobs", json={"file_path": str(shared_file)}))
+
+    assert job["file_path"] == os.path.realpath(shared_file)
+    # Hashed when the job runs instead
+    assert job["audio_hash"] is None
+    assert os.listdir(upload_dir) == []
+
+
+def test_shared_path_outside_the_shared_roots_is_rejected(client, tmp_path, shared_dir, submitted):
+    outside = tmp_path / "private.wav"
+    outside.write_bytes(b"RIFF audio")
+    link = shared_dir / "link.wav"
+    link.symlink_to(outside)
+
+    for path in (outside, link, shared_dir / ".." / "private.wav", shared_dir / "missing.wav"):
+        response = client.post("/jobs", json={"file_path": str(path)})
+        assert response.status_code == 400
+
+    assert submitted == []
+    assert outside.exists()
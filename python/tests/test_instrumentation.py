@@ -0,0 +1,106 @@
+import time
+
+import numpy as np
+import pytest
+
+from instrumentation import MetricsRegistry, PipelineMetrics, current_rss_bytes
+
+
+def test_timed_iter_counts_each_yielded_item():
+    metrics = PipelineMetrics()
+
+    assert list(metrics.timed_iter("whisper", iter(range(5)))) == [0, 1, 2, 3, 4]
+
+    stage = metrics.summary()["stages"]["whisper"]
+    assert stage["items"] == 5
+    # One timed step per item plus the final, empty one
+    assert stage["calls"] == 6
+    assert stage["items_per_second"] > 0
+
+
+def test_timed_iter_of_nothing_has_no_items():
+    metrics = PipelineMetrics()
+
+    assert list(metrics.timed_iter("whisper", [])) == []
+
+    stage = metrics.summary()["stages"]["whisper"]
+    assert stage["items"] == 0
+    assert stage["items_per_second"] is None
+
+
+def test_timed_iter_times_only_the_producer():
+    def slow():
+        time.sleep(0.05)
+        yield "batch"
+
+    metrics = PipelineMetrics()
+    for _ in metrics.timed_iter("whisper", slow()):
+        # Time spent by the consumer belongs to no stage
+        time.sleep(0.2)
+
+    assert 0.05 <= metrics.summary()["stages"]["whisper"]["wall_seconds"] < 0.2
+
+
+@pytest.mark.skipif(current_rss_bytes() is None, reason="RSS is not measurable here")
+def test_stage_peak_includes_memory_freed_before_the_stage_ends():
+    metrics = PipelineMetrics(rss_sample_seconds=0.01)
+
+    with metrics.stage("spike"):
+        spike = np.ones(16 * 2 ** 20 // 8)  # 16 MiB, every page touched
+        time.sleep(0.2)
+        del spike
+
+    stage = metrics.summary()["stages"]["spike"]
+    assert stage["rss_peak_bytes"] - stage["rss_start_bytes"] >= 12 * 2 ** 20
+    assert stage["rss_peak_bytes"] > stage["rss_end_bytes"]
+
+
+def test_sampler_stops_when_no_stage_is_running():
+    metrics = PipelineMetrics(rss_sample_seconds=0.01)
+    with metrics.stage("decode"):
+        pass
+
+    deadline = time.monotonic() + 2
+    while metrics._sampler._thread is not None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert metrics._sampler._thread is None
+
+
+def test_render_reports_runs_and_stage_totals():
+    registry = MetricsRegistry(prefix="test")
+    metrics = PipelineMetrics()
+    metrics.audio_seconds = 60.0
+    with metrics.stage("decode", items=1):
+        pass
+    list(metrics.timed_iter("whisper", range(3)))
+    metrics.mark_cached("segmentation")
+    metrics.finish()
+    registry.observe(metrics.summary())
+    registry.observe(metrics.summary())
+
+    text = registry.render({"jobs_pending": 2})
+    lines = text.splitlines()
+
+    assert text.endswith("\n")
+    assert "# TYPE test_runs_total counter" in lines
+    assert "test_runs_total 2" in lines
+    assert "test_audio_seconds_total 120.0" in lines
+    assert 'test_stage_items_total{stage="whisper"} 6' in lines
+    assert 'test_stage_items_total{stage="decode"} 2' in lines
+    assert 'test_stage_cache_hits_total{stage="segmentation"} 2' in lines
+    assert 'test_stage_cache_hits_total{stage="whisper"} 0' in lines
+    assert "# TYPE test_jobs_pending gauge" in lines
+    assert "test_jobs_pending 2" in lines
+    # Every sample follows its HELP and TYPE lines
+    for line in lines:
+        if not line.startswith("#"):
+            name = line.split("{")[0].split(" ")[0]
+            assert f"# TYPE {name} gauge" in lines or f"# TYPE {name} counter" in lines
+
+
+def test_render_before_any_run():
+    text = MetricsRegistry(prefix="test").render()
+
+    assert "test_runs_total 0" in text.splitlines()
+    assert "last_real_time_factor" not in text
+    assert "{stage=" not in text
@@ -0,0 +1,119 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from job_queue import DONE, FAILED, QUEUED, RUNNING, JobQueue, JobStore, QueueFullError
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.sqlite3"))
+
+
+def test_submissions_past_capacity_are_refused(store):
+    release = threading.Event()
+    started = []
+
+    def handler(file_path, audio_hash):
+        started.append(file_path)
+        release.wait(5)
+        return {"file": file_path}
+
+    queue = JobQueue(store, handler, max_workers=1, max_pending=1)
+    first = queue.submit("a.wav", "hash-a")
+    second = queue.submit("b.wav")
+
+    assert not queue.has_capacity()
+    with pytest.raises(QueueFullError):
+        queue.submit("c.wav")
+    assert queue.pending() == 2
+
+    release.set()
+    wait_for(lambda: queue.pending() == 0)
+    assert queue.has_capacity()
+    assert started == ["a.wav", "b.wav"]
+    assert store.get(first)["status"] == DONE
+    assert store.get(first)["result"] == {"file": "a.wav"}
+    assert store.get(first)["audio_hash"] == "hash-a"
+    assert store.get(second)["status"] == DONE
+
+
+def test_failed_insert_releases_its_slot(store, monkeypatch):
+    queue = JobQueue(store, lambda file_path, audio_hash: {}, max_workers=1, max_pending=0)
+
+    def fail(file_path, audio_hash=None):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(store, "create", fail)
+    with pytest.raises(sqlite3.OperationalError):
+        queue.submit("a.wav")
+
+    assert queue.pending() == 0
+    assert queue.has_capacity()
+
+
+def test_failed_job_is_recorded(store):
+    def handler(file_path, audio_hash):
+        raise ValueError("No valid segments found in audio")
+
+    queue = JobQueue(store, handler)
+    job_id = queue.submit("silence.wav")
+
+    wait_for(lambda: store.get(job_id)["status"] == FAILED)
+    assert store.get(job_id)["error"] == "No valid segments found in audio"
+    wait_for(lambda: queue.pending() == 0)
+
+
+def test_resume_requeues_unfinished_jobs(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    previous = JobStore(path)
+    queued = previous.create("queued.wav", "hash-q")
+    running = previous.create("running.wav")
+    previous.update(running, RUNNING)
+    done = previous.create("done.wav")
+    previous.update(done, DONE, result={"file": "done.wav"})
+
+    handled = []
+
+    def handler(file_path, audio_hash):
+        handled.append((file_path, audio_hash))
+        return {"file": file_path}
+
+    store = JobStore(path)
+    queue = JobQueue(store, handler, max_workers=1)
+    queue.resume()
+
+    wait_for(lambda: queue.pending() == 0)
+    assert handled == [("queued.wav", "hash-q"), ("running.wav", None)]
+    assert store.get(queued)["status"] == DONE
+    assert store.get(running)["status"] == DONE
+    assert store.get(done)["result"] == {"file": "done.wav"}
+    assert store.unfinished() == []
+
+
+def test_store_without_audio_hash_column_is_migrated(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    connection = sqlite3.connect(path)
+    with connection:
+        connection.execute(
+            "CREATE TABLE jobs (id TEXT PRIMARY KEY, status TEXT NOT NULL, file_path TEXT NOT NULL, "
+            "result TEXT, error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        connection.execute("INSERT INTO jobs VALUES ('old', ?, 'old.wav', NULL, NULL, 1.0, 1.0)", (QUEUED,))
+    connection.close()
+
+    store = JobStore(path)
+    job_id = store.create("new.wav", "hash-new")
+
+    assert store.get("old")["audio_hash"] is None
+    assert store.get(job_id)["audio_hash"] == "hash-new"
+    assert store.unfinished() == [("old", "old.wav", None), (job_id, "new.wav", "hash-new")]
@@ -0,0 +1,71 @@
+import random
+
+import pytest
+
+import process_audio
+
+
+def brute_force_filter(segments, overlapping_segments):
+    """The original O(N * M) overlap filter"""
+    return [segment for segment in segments
+            if not any(segment[0] < os_end and segment[1] > os_start
+                       for (os_start, os_end) in overlapping_segments)]
+
+
+def brute_force_trim(segments, overlapping_segments, min_duration):
+    """Clean pieces of each segment, found by walking every overlap region"""
+    pieces = []
+    for start, end in segments:
+        touching = sorted((os_start, os_end) for os_start, os_end in overlapping_segments
+                          if start < os_end and end > os_start)
+        if not touching:
+            pieces.append((start, end))
+            continue
+        position = start
+        for os_start, os_end in touching:
+            if os_start - position > min_duration:
+                pieces.append((position, os_start))
+            position = max(position, os_end)
+        if end - position > min_duration:
+            pieces.append((position, end))
+    return pieces
+
+
+def random_timeline(rng, count=40, length=300.0):
+    def intervals(n, max_length):
+        result = []
+        for _ in range(n):
+            start = round(rng.uniform(0, length), 1)
+            result.append((start, round(start + rng.uniform(0.1, max_length), 1)))
+        return result
+
+    segments = sorted(intervals(count, 20.0))
+    # Touching, nested and intersecting regions all occur at this density
+    overlaps = intervals(rng.randint(0, count), 5.0)
+    return segments, overlaps
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_filter_matches_brute_force(seed):
+    segments, overlaps = random_timeline(random.Random(seed))
+    assert process_audio.filter_non_overlapping_segments(segments, overlaps) == \
+        brute_force_filter(segments, overlaps)
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_trim_matches_brute_force(seed):
+    segments, overlaps = random_timeline(random.Random(seed))
+    assert process_audio.filter_non_overlapping_segments(segments, overlaps, trim=True, min_duration=0.5) == \
+        brute_force_trim(segments, overlaps, 0.5)
+
+
+def test_touching_regions_do_not_overlap():
+    # Intervals that only share an endpoint are not overlapping
+    assert process_audio.filter_non_overlapping_segments([(0.0, 1.0), (2.0, 3.0)], [(1.0, 2.0)]) == \
+        [(0.0, 1.0), (2.0, 3.0)]
+
+
+def test_no_overlap_regions_keeps_everything():
+    segments = [(0.0, 1.0), (1.5, 4.0)]
+    assert process_audio.filter_non_overlapping_segments(segments, []) == segments
+    assert process_audio.filter_non_overlapping_segments(segments, [], trim=True) == segments
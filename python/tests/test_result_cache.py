@@ -0,0 +1,112 @@
+import os
+
+import numpy as np
+import pytest
+
+import process_audio
+from result_cache import ResultCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResultCache(str(tmp_path / "cache"), max_bytes=10 ** 9)
+
+
+def entry_path(cache, key, extension=".json"):
+    return os.path.join(cache.cache_dir, f"{key}{extension}")
+
+
+def test_keys_depend_on_audio_stage_and_config(cache):
+    key = cache.make_key("a" * 64, "whisper", {"model": "small"})
+
+    assert key.startswith("whisper-")
+    assert key == cache.make_key("a" * 64, "whisper", {"model": "small"})
+    assert key != cache.make_key("b" * 64, "whisper", {"model": "small"})
+    assert key != cache.make_key("a" * 64, "speakers", {"model": "small"})
+    assert key != cache.make_key("a" * 64, "whisper", {"model": "medium"})
+
+
+def test_json_round_trip(cache):
+    cache.put("segmentation-1", {"segments": [[0.0, 1.5]], "duration": 3.0})
+
+    assert cache.get("segmentation-1") == {"segments": [[0.0, 1.5]], "duration": 3.0}
+    assert cache.get("segmentation-2") is None
+
+
+def test_array_round_trip(cache):
+    embeddings = np.arange(12, dtype=np.float32).reshape(3, 4)
+    cache.put_array("embeddings-1", embeddings)
+
+    loaded = cache.get_array("embeddings-1")
+    assert loaded.dtype == np.float32
+    np.testing.assert_array_equal(loaded, embeddings)
+    assert os.path.exists(entry_path(cache, "embeddings-1", ".npy"))
+    assert cache.get_array("embeddings-2") is None
+
+
+def test_unreadable_entries_are_discarded(cache):
+    with open(entry_path(cache, "broken"), "w") as f:
+        f.write("{not json")
+    with open(entry_path(cache, "broken", ".npy"), "wb") as f:
+        f.write(b"not an array")
+
+    assert cache.get("broken") is None
+    assert cache.get_array("broken") is None
+    assert not os.path.exists(entry_path(cache, "broken"))
+    assert not os.path.exists(entry_path(cache, "broken", ".npy"))
+
+
+def test_least_recently_used_entries_are_evicted_first(cache):
+    value = "x" * 1000
+    for age, key in enumerate(["c", "b", "a"]):
+        cache.put(key, value)
+        # Oldest first: a, then b, then c
+        os.utime(entry_path(cache, key), (1000 - age * 100, 1000 - age * 100))
+    entry_size = os.path.getsize(entry_path(cache, "a"))
+
+    # A hit makes "a" the most recently used entry
+    assert cache.get("a") == value
+    cache.max_bytes = 3 * entry_size
+    cache.put("d", value)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == value
+    assert cache.get("c") == value
+    assert cache.get("d") == value
+
+
+def test_repeat_run_is_served_without_loading_models(tmp_path, monkeypatch):
+    audio_file = tmp_path / "meeting.wav"
+    audio_file.write_bytes(b"RIFF" + bytes(1000))
+    audio = np.zeros(process_audio.SAMPLE_RATE * 12, dtype=np.float32)
+    loads = []
+
+    monkeypatch.setattr(process_audio, "result_cache", ResultCache(str(tmp_path / "cache"), max_bytes=10 ** 9))
+    monkeypatch.setattr(process_audio, "load_models", lambda: loads.append("models"))
+    monkeypatch.setattr(process_audio, "refresh_speaker_enrollment", lambda: loads.append("enrollment"))
+    # A loaded segmentation model and configured speaker models, so results are cacheable
+    monkeypatch.setattr(process_audio, "segmentation_inference", object())
+    monkeypatch.setattr(process_audio, "speakers_cacheable", lambda: True)
+    monkeypatch.setattr(process_audio, "load_audio", lambda path, work_dir: audio)
+    monkeypatch.setattr(process_audio, "preprocess_audio", lambda audio, segments, work_dir=None: audio)
+    monkeypatch.setattr(process_audio, "segment_speech_and_overlap",
+                        lambda audio: ([(0.0, 3.0), (4.0, 7.0), (8.0, 11.0)], []))
+    monkeypatch.setattr(process_audio, "predict_speaker_for_segments",
+                        lambda segments, audio, class_names, embedding_key=None:
+                        [(f"Speaker {index % 2 + 1}", 0.9) for index in range(len(segments))])
+    monkeypatch.setattr(process_audio, "iter_whisper_transcriptions",
+                        lambda segments, audio, overlapped=None, word_timestamps=False:
+                        ((index, f"text {index}") for index in range(len(segments))))
+
+    first = list(process_audio.iter_transcript_segments(str(audio_file)))
+    assert loads == ["models", "enrollment"]
+    assert [segment["text"] for segment in first] == ["text 0", "text 1", "text 2"]
+
+    def fail(*args, **kwargs):
+        raise AssertionError("a cache hit must not load models or decode audio")
+
+    for name in ["load_models", "refresh_speaker_enrollment", "load_audio", "segment_speech_and_overlap",
+                 "predict_speaker_for_segments", "iter_whisper_transcriptions"]:
+        monkeypatch.setattr(process_audio, name, fail)
+
+    assert list(process_audio.iter_transcript_segments(str(audio_file))) == first
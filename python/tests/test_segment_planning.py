@@ -0,0 +1,137 @@
+import threading
+
+import numpy as np
+import pytest
+
+import process_audio
+
+SAMPLE_RATE = process_audio.SAMPLE_RATE
+
+
+def noise(seconds, seed=0):
+    return np.random.default_rng(seed).normal(0, 0.3, int(seconds * SAMPLE_RATE)).astype(np.float32)
+
+
+def random_pieces(rng, count, max_length=90.0):
+    pieces = []
+    time = 0.0
+    for _ in range(count):
+        time += rng.uniform(0.0, 2.0)
+        length = rng.uniform(0.2, max_length) if rng.random() < 0.3 else rng.uniform(0.2, 8.0)
+        pieces.append((time, time + length, bool(rng.random() < 0.2)))
+        time += length
+    return pieces
+
+
+@pytest.mark.parametrize("silence_at", [4.0, 9.3, 17.75])
+def test_quiet_point_is_found_in_injected_silence(silence_at):
+    audio = noise(20)
+    audio[int((silence_at - 0.2) * SAMPLE_RATE):int((silence_at + 0.2) * SAMPLE_RATE)] = 0.0
+
+    point = process_audio.find_quiet_point(audio, 1.0, 19.5)
+
+    assert abs(point - silence_at) <= 0.2
+
+
+def test_quiet_point_of_a_tiny_span_is_its_middle():
+    assert process_audio.find_quiet_point(noise(1), 0.5, 0.55) == pytest.approx(0.525)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_split_pieces_fit_whisper_windows(seed):
+    rng = np.random.default_rng(seed)
+    pieces = random_pieces(rng, 15)
+    audio = noise(pieces[-1][1] + 1, seed)
+
+    split = process_audio.split_long_pieces(pieces, lambda: audio)
+
+    assert all(end - start <= process_audio.WHISPER_WINDOW_SECONDS for start, end, _ in split)
+    # The splits cover each piece exactly, in order, and keep its flag
+    covered = iter(split)
+    for start, end, flag in pieces:
+        part_start, part_end, part_flag = next(covered)
+        assert (part_start, part_flag) == (start, flag)
+        while part_end != end:
+            # Cuts are at least half a window into the remainder
+            assert part_end - part_start >= process_audio.WHISPER_WINDOW_SECONDS / 2
+            previous_end = part_end
+            part_start, part_end, part_flag = next(covered)
+            assert (part_start, part_flag) == (previous_end, flag)
+    assert next(covered, None) is None
+
+
+def test_short_pieces_are_split_without_decoding():
+    def get_audio():
+        raise AssertionError("audio is only needed to split long pieces")
+
+    pieces = [(0.0, 12.0, False), (13.0, 43.0, True)]
+    assert process_audio.split_long_pieces(pieces, get_audio) == pieces
+
+
+def test_long_piece_is_cut_at_injected_silence():
+    audio = noise(50)
+    audio[int(21.8 * SAMPLE_RATE):int(22.2 * SAMPLE_RATE)] = 0.0
+
+    split = process_audio.split_long_pieces([(0.0, 50.0, False)], lambda: audio)
+
+    assert len(split) == 2
+    assert abs(split[0][1] - 22.0) <= 0.2
+    assert split[0][1] == split[1][0]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_merged_windows_never_cross_a_speaker_or_overlap_change(seed):
+    rng = np.random.default_rng(seed)
+    pieces = random_pieces(rng, 60, max_length=10.0)
+    labels = [None if flag else f"Speaker {rng.integers(3)}" for _, _, flag in pieces]
+
+    windows = process_audio.merge_pieces(pieces, labels)
+
+    assert [index for window in windows for index in window] == list(range(len(pieces)))
+    for window in windows:
+        assert len({labels[index] for index in window}) == 1
+        assert len({pieces[index][2] for index in window}) == 1
+        if len(window) > 1:
+            assert pieces[window[-1]][1] - pieces[window[0]][0] <= process_audio.SEGMENT_TARGET_SECONDS
+        for previous, current in zip(window, window[1:]):
+            assert pieces[current][0] - pieces[previous][1] <= process_audio.SEGMENT_MAX_GAP_SECONDS
+
+
+def test_same_speaker_neighbours_are_merged():
+    pieces = [(0.0, 3.0, False), (3.2, 6.0, False), (6.1, 8.0, False), (8.1, 9.0, True), (9.2, 11.0, False)]
+    labels = ["A", "A", "B", None, "B"]
+
+    assert process_audio.merge_pieces(pieces, labels) == [[0, 1], [2], [3], [4]]
+
+
+def test_streaming_transcription_does_not_wait_for_speakers(tmp_path, monkeypatch):
+    audio_file = tmp_path / "meeting.wav"
+    audio_file.write_bytes(b"RIFF" + bytes(1000))
+    audio = np.zeros(SAMPLE_RATE * 12, dtype=np.float32)
+    whisper_started = threading.Event()
+    speakers_waited = []
+
+    def predict(segments, audio, class_names, embedding_key=None):
+        # Speakers can only finish once Whisper has started
+        speakers_waited.append(whisper_started.wait(5))
+        return [("Speaker 1", 0.9) for _ in segments]
+
+    def transcribe(segments, audio, overlapped=None, word_timestamps=False):
+        whisper_started.set()
+        for index in range(len(segments)):
+            yield index, f"text {index}"
+
+    monkeypatch.setattr(process_audio, "load_models", lambda: None)
+    monkeypatch.setattr(process_audio, "refresh_speaker_enrollment", lambda: None)
+    monkeypatch.setattr(process_audio, "load_audio", lambda path, work_dir: audio)
+    monkeypatch.setattr(process_audio, "preprocess_audio", lambda audio, segments, work_dir=None: audio)
+    monkeypatch.setattr(process_audio, "segment_speech_and_overlap",
+                        lambda audio: ([(0.0, 3.0), (3.2, 7.0), (7.3, 11.0)], []))
+    monkeypatch.setattr(process_audio, "predict_speaker_for_segments", predict)
+    monkeypatch.setattr(process_audio, "iter_whisper_transcriptions", transcribe)
+
+    segments = list(process_audio.iter_transcript_segments(str(audio_file), merge_windows=False))
+
+    assert speakers_waited == [True]
+    assert [segment["text"] for segment in segments] == ["text 0", "text 1", "text 2"]
+    assert all(segment["speaker"] == "Speaker 1" for segment in segments)
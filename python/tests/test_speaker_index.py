@@ -0,0 +1,94 @@
+import os
+
+import numpy as np
+import pytest
+
+from speaker_index import SpeakerIndex, build_index, load_or_build_index
+
+DIMENSION = 16
+
+
+class FakeEmbedder:
+    """Embeds a clip as the vector stored for its path"""
+
+    def __init__(self, name="fake"):
+        self.name = name
+        self.calls = 0
+
+    def embed(self, samples_list):
+        self.calls += 1
+        return np.stack(samples_list)
+
+
+def add_clip(source, person, clip, vectors, rng):
+    person_dir = os.path.join(source, person)
+    os.makedirs(person_dir, exist_ok=True)
+    path = os.path.join(person_dir, clip)
+    with open(path, "wb") as f:
+        f.write(rng.bytes(16))
+    vectors[path] = rng.normal(size=DIMENSION).astype(np.float32)
+    return path
+
+
+@pytest.fixture
+def enrollment(tmp_path):
+    rng = np.random.default_rng(0)
+    source = str(tmp_path / "audio")
+    vectors = {}
+    for person, clips in (("alice", 3), ("bob", 1), ("carol", 2)):
+        for number in range(clips):
+            add_clip(source, person, f"clip{number}.wav", vectors, rng)
+    return source, str(tmp_path / "index"), vectors, rng
+
+
+def normalize(vectors):
+    return vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)
+
+
+def test_person_scores_match_brute_force(enrollment):
+    source, directory, vectors, rng = enrollment
+    index = build_index(source, directory, FakeEmbedder(), vectors.__getitem__)
+    assert index.names == ["alice", "bob", "carol"]
+
+    queries = rng.normal(size=(10, DIMENSION)).astype(np.float32)
+    expected = np.array([[max(float(normalize(query) @ normalize(vector))
+                              for path, vector in vectors.items() if os.path.basename(os.path.dirname(path)) == name)
+                          for name in index.names] for query in queries])
+    np.testing.assert_allclose(index.person_scores(queries), expected, rtol=1e-5, atol=1e-6)
+
+    names, scores = index.query(queries, k=2)
+    for row, query_names, query_scores in zip(expected, names, scores):
+        best = np.argsort(-row)[:2]
+        assert query_names == [index.names[person] for person in best]
+        np.testing.assert_allclose(query_scores, row[best], rtol=1e-5, atol=1e-6)
+
+
+def test_index_is_reused_until_clips_change(enrollment):
+    source, directory, vectors, rng = enrollment
+    embedder = FakeEmbedder()
+    first = load_or_build_index(source, directory, embedder, vectors.__getitem__)
+    assert embedder.calls == 1
+
+    # Unchanged clips: the stored index is loaded without embedding anything
+    again = load_or_build_index(source, directory, embedder, vectors.__getitem__)
+    assert embedder.calls == 1
+    assert again.fingerprint == first.fingerprint
+
+    add_clip(source, "dave", "clip0.wav", vectors, rng)
+    rebuilt = load_or_build_index(source, directory, embedder, vectors.__getitem__)
+    assert embedder.calls == 2
+    assert rebuilt.names == ["alice", "bob", "carol", "dave"]
+    assert SpeakerIndex.load(directory).fingerprint == rebuilt.fingerprint
+
+
+def test_index_is_rebuilt_for_another_model(enrollment):
+    source, directory, vectors, _ = enrollment
+    load_or_build_index(source, directory, FakeEmbedder("fake"), vectors.__getitem__)
+    other = FakeEmbedder("other")
+    index = load_or_build_index(source, directory, other, vectors.__getitem__)
+    assert other.calls == 1
+    assert index.model == "other"
+
+
+def test_no_clips_means_no_index(tmp_path):
+    assert load_or_build_index(str(tmp_path / "audio"), str(tmp_path / "index"), FakeEmbedder(), None) is None
@@ -0,0 +1,50 @@
+import random
+
+import pytest
+
+import process_audio
+from test_overlap_filter import random_timeline
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_clean_pieces_match_trim(seed):
+    segments, overlaps = random_timeline(random.Random(seed))
+    pieces = process_audio.split_at_overlaps(segments, overlaps, min_duration=0.5)
+    assert [(start, end) for start, end, overlapped in pieces if not overlapped] == \
+        process_audio.filter_non_overlapping_segments(segments, overlaps, trim=True, min_duration=0.5)
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_only_overlapped_pieces_touch_overlap_regions(seed):
+    segments, overlaps = random_timeline(random.Random(seed))
+    for start, end, overlapped in process_audio.split_at_overlaps(segments, overlaps):
+        assert end > start
+        touches = any(start < os_end and end > os_start for os_start, os_end in overlaps)
+        assert touches == overlapped
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_pieces_cover_segments_in_order(seed):
+    segments, overlaps = random_timeline(random.Random(seed))
+    pieces = process_audio.split_at_overlaps(segments, overlaps)
+    # Without a minimum duration, the pieces of each segment tile it exactly
+    position = 0
+    for start, end in segments:
+        assert pieces[position][0] == start
+        while pieces[position][1] != end:
+            assert pieces[position + 1][0] == pieces[position][1]
+            position += 1
+        position += 1
+    assert position == len(pieces)
+
+
+def test_overlap_modes():
+    segments = [(0.0, 4.0), (5.0, 6.0)]
+    overlaps = [(1.0, 2.0)]
+    assert process_audio.plan_overlap_handling(segments, overlaps, mode="drop") == [(5.0, 6.0, False)]
+    assert process_audio.plan_overlap_handling(segments, overlaps, mode="trim") == \
+        [(0.0, 1.0, False), (2.0, 4.0, False), (5.0, 6.0, False)]
+    assert process_audio.plan_overlap_handling(segments, overlaps, mode="split") == \
+        [(0.0, 1.0, False), (1.0, 2.0, True), (2.0, 4.0, False), (5.0, 6.0, False)]
+    with pytest.raises(ValueError):
+        process_audio.plan_overlap_handling(segments, overlaps, mode="keep")
@@ -0,0 +1,83 @@
+import io
+import random
+
+import pytest
+
+from transcript_assembler import TranscriptAssembler
+
+
+def combine_lines(records):
+    """The original list-building merge of consecutive same-speaker segments"""
+    combined_transcript = []
+    previous_speaker = None
+    combined_text = ""
+    for speaker, text in records:
+        if not text.strip():
+            continue
+        if speaker == previous_speaker:
+            combined_text += " " + text
+        else:
+            if previous_speaker:
+                combined_transcript.append(f"{previous_speaker}: {combined_text.strip()}")
+            previous_speaker = speaker
+            combined_text = text
+    if previous_speaker:
+        combined_transcript.append(f"{previous_speaker}: {combined_text.strip()}")
+    return combined_transcript
+
+
+def random_records(seed):
+    rng = random.Random(seed)
+    records = []
+    time = 0.0
+    for _ in range(rng.randint(0, 60)):
+        start = time + rng.uniform(0.0, 1.0)
+        time = start + rng.uniform(0.5, 10.0)
+        text = rng.choice(["", "   ", "hello", "magandang umaga", "the IPCR is due", "okay."])
+        records.append((rng.choice(["Alice", "Bob", "Speaker 1"]), text, start, time))
+    return records
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_matches_list_merge(seed):
+    records = random_records(seed)
+    out = io.StringIO()
+    turns = []
+    assembler = TranscriptAssembler(out, on_turn=turns.append)
+    assembler.add_all((speaker, text, start, end, False) for speaker, text, start, end in records)
+    assembler.close()
+
+    expected = combine_lines((speaker, text) for speaker, text, _, _ in records)
+    assert out.getvalue() == "\n".join(expected)
+    assert [f"{turn['speaker']}: {turn['text']}" for turn in turns] == expected
+    assert assembler.lines == len(expected)
+    assert assembler.speakers == list(dict.fromkeys(speaker for speaker, text, _, _ in records if text.strip()))
+
+
+def test_tracks_turn_times_and_duration():
+    turns = []
+    assembler = TranscriptAssembler(on_turn=turns.append)
+    assembler.add("Alice", "one", 0.0, 1.0)
+    assembler.add("Alice", "two", 1.5, 2.5)
+    assembler.add("Bob", "three", 3.0, 4.0)
+    assembler.add("Bob", " ", 4.0, 9.0)
+    assembler.close()
+
+    assert [(turn["start"], turn["end"]) for turn in turns] == [(0.0, 2.5), (3.0, 4.0)]
+    assert assembler.segments == 3
+    assert assembler.duration == 4.0
+
+
+def test_overlapped_speech_is_not_a_speaker():
+    out = io.StringIO()
+    turns = []
+    assembler = TranscriptAssembler(out, on_turn=turns.append)
+    assembler.add("Alice", "one", 0.0, 1.0)
+    assembler.add(None, "both", 1.0, 2.0, overlap=True)
+    assembler.add(None, "still both", 2.0, 3.0, overlap=True)
+    assembler.add("Alice", "two", 3.0, 4.0)
+    assembler.close()
+
+    assert out.getvalue() == "Alice: one\nOverlap: both still both\nAlice: two"
+    assert assembler.speakers == ["Alice"]
+    assert turns[1]["speaker"] is None and turns[1]["overlap"]
@@ -0,0 +1,55 @@
+import random
+
+import pytest
+
+from transcript_index import StructuredTranscriptWriter, find_segment, iter_segments_between, load_index
+
+
+def write_transcript(path, seed):
+    rng = random.Random(seed)
+    segments = []
+    time = 0.0
+    with StructuredTranscriptWriter(str(path)) as writer:
+        for number in range(rng.randint(1, 80)):
+            start = time + rng.uniform(0.0, 2.0)
+            time = start + rng.uniform(0.5, 15.0)
+            segment = {"start": start, "end": time, "speaker": rng.choice(["Alice", "Bob", None]),
+                       "confidence": rng.random(), "text": f"segment {number} ñ", "overlap": False}
+            writer.write(segment)
+            segments.append(segment)
+    return segments
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_find_segment_matches_linear_scan(tmp_path, seed):
+    path = tmp_path / "meeting_transcript.jsonl"
+    segments = write_transcript(path, seed)
+    index = load_index(str(path))
+    assert len(index) == len(segments)
+
+    rng = random.Random(seed)
+    for _ in range(100):
+        time = rng.uniform(-1.0, segments[-1]["end"] + 1.0)
+        expected = next((segment for segment in segments if segment["start"] <= time < segment["end"]), None)
+        assert find_segment(str(path), time, index) == expected
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_segments_between_match_linear_scan(tmp_path, seed):
+    path = tmp_path / "meeting_transcript.jsonl"
+    segments = write_transcript(path, seed)
+
+    rng = random.Random(seed)
+    for _ in range(20):
+        start = rng.uniform(0.0, segments[-1]["end"])
+        end = start + rng.uniform(0.0, 60.0)
+        expected = [segment for segment in segments if segment["start"] < end and segment["end"] > start]
+        assert list(iter_segments_between(str(path), start, end)) == expected
+
+
+def test_empty_transcript(tmp_path):
+    path = tmp_path / "empty_transcript.jsonl"
+    StructuredTranscriptWriter(str(path)).close()
+    assert len(load_index(str(path))) == 0
+    assert find_segment(str(path), 1.0) is None
+    assert list(iter_segments_between(str(path), 0.0, 10.0)) == []
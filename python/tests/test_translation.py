@@ -0,0 +1,111 @@
+import pytest
+
+import process_audio
+from translation_backends import (StubTranslationBackend, TranslationBackend, TranslationCache,
+                                  pack_batches, translate_chunks)
+
+
+class FailingBackend(TranslationBackend):
+    """Fails every batch containing a chunk from `failing`, translates the rest"""
+
+    name = "failing"
+
+    def __init__(self, failing):
+        super().__init__()
+        self.failing = set(failing)
+
+    def translate_batch(self, texts):
+        if self.failing.intersection(texts):
+            raise RuntimeError("service unavailable")
+        return [text.upper() for text in texts]
+
+
+class RecordingBackend(StubTranslationBackend):
+    """Stub that remembers every chunk it was asked to translate"""
+
+    def __init__(self, phrases=None):
+        super().__init__(phrases)
+        self.sent = []
+
+    def translate_batch(self, texts):
+        self.sent.extend(texts)
+        return super().translate_batch(texts)
+
+
+@pytest.fixture
+def cache():
+    return TranslationCache(":memory:")
+
+
+def test_repeated_chunks_are_sent_once():
+    backend = RecordingBackend({"magandang umaga": "good morning", "salamat": "thank you"})
+    chunks = ["magandang umaga", "salamat", "magandang umaga", "salamat", "magandang umaga"]
+
+    result = translate_chunks(backend, chunks)
+
+    assert result == ["good morning", "thank you", "good morning", "thank you", "good morning"]
+    assert sorted(backend.sent) == ["magandang umaga", "salamat"]
+
+
+def test_second_call_is_served_from_cache(cache):
+    backend = StubTranslationBackend({"salamat": "thank you"})
+
+    first = translate_chunks(backend, ["salamat", "oo"], cache)
+    requests = backend.requests
+    second = translate_chunks(backend, ["oo", "salamat"], cache)
+
+    assert first == ["thank you", "oo"]
+    assert second == ["oo", "thank you"]
+    assert requests > 0
+    assert backend.requests == requests
+
+
+def test_failing_batch_is_untranslated_and_not_cached(cache):
+    backend = FailingBackend(failing=["bad"])
+
+    assert translate_chunks(backend, ["bad"], cache) == ["bad"]
+    assert cache.get_many(backend.name, backend.source, backend.target, ["bad"]) == {}
+
+    # Once the service recovers the chunk is translated rather than served stale
+    backend.failing.clear()
+    assert translate_chunks(backend, ["bad"], cache) == ["BAD"]
+
+
+def test_cache_entries_are_isolated_by_backend(cache):
+    stub = StubTranslationBackend()
+    translate_chunks(stub, ["salamat"], cache)
+
+    other = StubTranslationBackend({"salamat": "thank you"})
+    other.name = "other"
+
+    assert translate_chunks(other, ["salamat"], cache) == ["thank you"]
+    assert other.requests == 1
+    assert cache.get_many("stub", "tl", "en", ["salamat"]) == {"salamat": "salamat"}
+    assert cache.get_many("other", "tl", "en", ["salamat"]) == {"salamat": "thank you"}
+
+
+@pytest.mark.parametrize("max_chars", [10, 50, 4500])
+def test_pack_batches_respects_size_limit(max_chars):
+    texts = [f"chunk {i} " + "x" * (i % 7) for i in range(200)]
+
+    batches = pack_batches(texts, max_chars)
+
+    assert [text for batch in batches for text in batch] == texts
+    for batch in batches:
+        # A single oversized text still gets a batch of its own
+        assert len(batch) == 1 or len("\n".join(batch)) < max_chars
+
+
+def test_find_terms_matches_whole_words_only():
+    translator = process_audio.TranscriptTranslator(backend=StubTranslationBackend())
+
+    assert translator.find_terms("the ITinerary and the OJTs") == []
+    assert translator.find_terms("The dean asked IT about the ojt") == ["Dean", "IT", "OJT"]
+
+
+def test_restore_terms_appends_only_missing_terms():
+    translator = process_audio.TranscriptTranslator(backend=StubTranslationBackend())
+
+    assert translator.restore_terms("si Dean sa IT", "the dean in IT") == "the dean in IT"
+    assert translator.restore_terms("si Dean sa IT", "the head") == "the head Dean IT"
+    assert translator.restore_terms("ITinerary", "itinerary") == "itinerary"
@@ -0,0 +1,86 @@
+from typing import Callable, Dict, Iterable, List, Optional, TextIO, Tuple
+
+# Line label of overlapped speech, which has no single speaker
+OVERLAP_LABEL = "Overlap"
+
+
+def format_turn(turn: Dict[str, object]) -> str:
+    """A finished turn as its "Speaker: text" transcript line"""
+    label = OVERLAP_LABEL if turn["overlap"] else turn["speaker"]
+    return f"{label}: {turn['text']}"
+
+
+class TranscriptAssembler:
+    """Merges consecutive same-speaker segments into "Speaker: text" lines in one pass.
+
+    Each line is written to `out` as soon as the next speaker starts, so only
+    the current turn is held in memory. Speakers, line count and duration are
+    tracked along the way; on_turn, if given, is called with every finished
+    turn as {"speaker", "overlap", "text", "start", "end"}. Overlapped speech
+    is written as "Overlap: text" lines, has speaker None and is not counted
+    among the speakers.
+    """
+
+    def __init__(self, out: Optional[TextIO] = None,
+                 on_turn: Optional[Callable[[Dict[str, object]], None]] = None):
+        self.out = out
+        self.on_turn = on_turn
+        self.speakers: List[str] = []
+        self.lines = 0
+        self.segments = 0
+        self.duration = 0.0
+        self._seen = set()
+        self._speaker = None
+        self._overlap = False
+        self._parts: List[str] = []
+        self._start = None
+        self._end = None
+
+    def add(self, speaker: Optional[str], text: str, start: float, end: float, overlap: bool = False):
+        """Add one transcribed segment; segments with no text are skipped."""
+        text = text.strip()
+        if not text:
+            return
+
+        if overlap:
+            speaker = None
+        self.segments += 1
+        self.duration = max(self.duration, float(end))
+        if speaker != self._speaker or overlap != self._overlap or not self._parts:
+            self._flush()
+            self._speaker = speaker
+            self._overlap = overlap
+            self._start = float(start)
+            if not overlap and speaker not in self._seen:
+                self._seen.add(speaker)
+                self.speakers.append(speaker)
+        self._parts.append(text)
+        self._end = float(end)
+
+    def add_all(self, records: Iterable[Tuple[Optional[str], str, float, float, bool]]):
+        for speaker, text, start, end, overlap in records:
+            self.add(speaker, text, start, end, overlap)
+
+    def close(self):
+        """Write the last turn; returns the assembler for chaining."""
+        self._flush()
+        self._speaker = None
+        self._overlap = False
+        return self
+
+    def _flush(self):
+        if not self._parts:
+            return
+
+        turn = {"speaker": self._speaker, "overlap": self._overlap, "text": " ".join(self._parts),
+                "start": self._start, "end": self._end}
+        if self.out is not None:
+            if self.lines:
+                self.out.write("\n")
+            self.out.write(format_turn(turn))
+            self.out.flush()
+        self.lines += 1
+
+        if self.on_turn is not None:
+            self.on_turn(turn)
+        self._parts = []
@@ -0,0 +1,85 @@
+import json
+import os
+from typing import Any, Dict, Iterator, Optional
+
+import numpy as np
+
+# One fixed-size record per JSONL line: its time span and byte offset
+INDEX_RECORD = np.dtype([("start", "<f8"), ("end", "<f8"), ("offset", "<u8")])
+
+
+def index_path_for(segments_path: str) -> str:
+    return os.path.splitext(segments_path)[0] + ".idx"
+
+
+class StructuredTranscriptWriter:
+    """Writes transcript segments as JSON Lines plus a binary seek index.
+
+    Each segment is one line of {"start", "end", "speaker", "confidence",
+    "text", "overlap", ...}; the .idx sidecar holds a (start, end, offset)
+    record per line in timeline order, so a reader can binary-search a time
+    and read just that line. Both files are flushed after every segment.
+    """
+
+    def __init__(self, segments_path: str):
+        self.segments_path = segments_path
+        self.index_path = index_path_for(segments_path)
+        self._segments = open(segments_path, "wb")
+        self._index = open(self.index_path, "wb")
+        self.count = 0
+
+    def write(self, segment: Dict[str, Any]):
+        offset = self._segments.tell()
+        self._segments.write(json.dumps(segment, ensure_ascii=False).encode("utf-8") + b"\n")
+        record = np.array([(segment["start"], segment["end"], offset)], dtype=INDEX_RECORD)
+        self._index.write(record.tobytes())
+        self._segments.flush()
+        self._index.flush()
+        self.count += 1
+
+    def close(self):
+        self._segments.close()
+        self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def load_index(segments_path: str) -> np.ndarray:
+    """The seek index of a JSONL transcript, memory-mapped"""
+    path = index_path_for(segments_path)
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=INDEX_RECORD)
+    return np.memmap(path, dtype=INDEX_RECORD, mode="r")
+
+
+def read_segment(segments_path: str, offset: int) -> Dict[str, Any]:
+    with open(segments_path, "rb") as f:
+        f.seek(offset)
+        return json.loads(f.readline())
+
+
+def find_segment(segments_path: str, time: float, index: Optional[np.ndarray] = None) -> Optional[Dict[str, Any]]:
+    """The segment being spoken at `time` (seconds), or None during silence"""
+    index = load_index(segments_path) if index is None else index
+    position = int(np.searchsorted(index["start"], time, side="right")) - 1
+    if position < 0 or index["end"][position] <= time:
+        return None
+    return read_segment(segments_path, int(index["offset"][position]))
+
+
+def iter_segments_between(segments_path: str, start: float, end: float,
+                          index: Optional[np.ndarray] = None) -> Iterator[Dict[str, Any]]:
+    """Segments that overlap [start, end), read from their offsets without scanning the file"""
+    index = load_index(segments_path) if index is None else index
+    first = max(int(np.searchsorted(index["start"], start, side="right")) - 1, 0)
+    last = int(np.searchsorted(index["start"], end, side="left"))
+    with open(segments_path, "rb") as f:
+        for position in range(first, last):
+            if index["end"][position] <= start:
+                continue
+            f.seek(int(index["offset"][position]))
+            yield json.loads(f.readline())
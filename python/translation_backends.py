@@ -0,0 +1,184 @@
+import logging
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+# Google's web endpoint rejects requests over 5000 characters
+MAX_BATCH_CHARS = 4500
+MAX_CONCURRENT_REQUESTS = int(os.environ.get("TRANSLATION_MAX_WORKERS", 4))
+
+
+class TranslationBackend:
+    """Translates batches of text chunks from `source` to `target` language.
+
+    `name` identifies the backend in the translation cache, so translations
+    from one backend are never served for another.
+    """
+
+    name = "base"
+
+    def __init__(self, source: str = 'tl', target: str = 'en'):
+        self.source = source
+        self.target = target
+
+    def translate_batch(self, texts: List[str]) -> List[str]:
+        raise NotImplementedError
+
+
+class GoogleTranslationBackend(TranslationBackend):
+    """Packs many chunks into one request to a deep_translator GoogleTranslator.
+
+    A GoogleTranslator keeps the text of the request in progress on the
+    instance, so it can't be shared between threads; make_translator is
+    called once per worker thread to give each its own.
+    """
+
+    name = "google"
+
+    def __init__(self, make_translator: Callable[[], Any], source: str = 'tl', target: str = 'en'):
+        super().__init__(source, target)
+        self.make_translator = make_translator
+        self.logger = logging.getLogger(__name__)
+        self._local = threading.local()
+
+    @property
+    def translator(self):
+        """This thread's translator"""
+        if not hasattr(self._local, "translator"):
+            self._local.translator = self.make_translator()
+        return self._local.translator
+
+    def translate_batch(self, texts: List[str]) -> List[str]:
+        translator = self.translator
+        # One chunk per line; Google keeps line breaks, so the response can be
+        # split back into the original chunks
+        translated = translator.translate("\n".join(texts)) or ""
+        parts = [part.strip() for part in translated.split("\n")]
+        if len(parts) == len(texts):
+            return parts
+
+        self.logger.warning(f"Batch of {len(texts)} chunks came back as {len(parts)} lines, translating one by one")
+        return [translator.translate(text) or text for text in texts]
+
+
+class StubTranslationBackend(TranslationBackend):
+    """Offline backend for tests: looks chunks up in a phrase table, otherwise returns them unchanged."""
+
+    name = "stub"
+
+    def __init__(self, phrases: Optional[Dict[str, str]] = None, source: str = 'tl', target: str = 'en'):
+        super().__init__(source, target)
+        self.phrases = phrases or {}
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def translate_batch(self, texts: List[str]) -> List[str]:
+        with self._lock:
+            self.requests += 1
+        return [self.phrases.get(text, text) for text in texts]
+
+
+class TranslationCache:
+    """Persistent phrase-level translation cache backed by SQLite, keyed by backend and language pair."""
+
+    def __init__(self, path: str):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            # Caches created before entries were keyed by backend can hold
+            # another backend's output (e.g. stub identity translations), so
+            # they are discarded rather than migrated
+            columns = {row[1] for row in self._connection.execute("PRAGMA table_info(translations)")}
+            if columns and "backend" not in columns:
+                self._connection.execute("DROP TABLE translations")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS translations ("
+                "backend TEXT NOT NULL, source TEXT NOT NULL, target TEXT NOT NULL, "
+                "text TEXT NOT NULL, translation TEXT NOT NULL, "
+                "PRIMARY KEY (backend, source, target, text))"
+            )
+
+    def get_many(self, backend: str, source: str, target: str, texts: Iterable[str]) -> Dict[str, str]:
+        found = {}
+        texts = list(texts)
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(texts), 500):
+                chunk = texts[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._connection.execute(
+                    f"SELECT text, translation FROM translations "
+                    f"WHERE backend = ? AND source = ? AND target = ? AND text IN ({placeholders})",
+                    [backend, source, target] + chunk
+                )
+                found.update(rows)
+        return found
+
+    def put_many(self, backend: str, source: str, target: str, translations: Dict[str, str]):
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO translations (backend, source, target, text, translation) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(backend, source, target, text, translation) for text, translation in translations.items()]
+            )
+
+
+def create_default_translation_cache() -> Optional[TranslationCache]:
+    """Build the cache from TRANSLATION_CACHE* environment settings, or None when disabled."""
+    if os.environ.get("TRANSLATION_CACHE", "1") == "0":
+        return None
+
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    path = os.environ.get("TRANSLATION_CACHE_PATH", os.path.join(project_root, "cache", "translations.sqlite3"))
+    return TranslationCache(path)
+
+
+def pack_batches(texts: List[str], max_chars: int = MAX_BATCH_CHARS) -> List[List[str]]:
+    """Group texts into batches whose joined length stays under max_chars."""
+    batches = []
+    batch = []
+    size = 0
+    for text in texts:
+        if batch and size + len(text) + 1 > max_chars:
+            batches.append(batch)
+            batch = []
+            size = 0
+        batch.append(text)
+        size += len(text) + 1
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def translate_chunks(backend: TranslationBackend, chunks: List[str],
+                     cache: Optional[TranslationCache] = None,
+                     max_workers: int = MAX_CONCURRENT_REQUESTS) -> List[str]:
+    """Translate chunks with deduplication, caching, batching and bounded concurrency.
+
+    Chunks whose batch fails are returned untranslated and are not cached.
+    """
+    logger = logging.getLogger(__name__)
+    unique = list(dict.fromkeys(chunks))
+    translations = cache.get_many(backend.name, backend.source, backend.target, unique) if cache is not None else {}
+    missing = [chunk for chunk in unique if chunk not in translations]
+
+    def run_batch(batch):
+        try:
+            return dict(zip(batch, backend.translate_batch(batch)))
+        except Exception as e:
+            logger.error(f"Translation error: {e}")
+            return {}
+
+    if missing:
+        batches = pack_batches(missing)
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(batches)))) as executor:
+            for translated in executor.map(run_batch, batches):
+                translations.update(translated)
+                if cache is not None and translated:
+                    cache.put_many(backend.name, backend.source, backend.target, translated)
+
+    return [translations.get(chunk, chunk) for chunk in chunks]
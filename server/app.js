@@ -105,6 +105,26 @@ app.get('/api/test', async (req, res) => {
   }
 });
 
+// Poll the Flask job API until the job has finished
+const JOB_POLL_INTERVAL_MS = 2000;
+
+const waitForJobResult = async (axios, jobId) => {
+  for (;;) {
+    const response = await axios.get(`http://localhost:5000/jobs/${jobId}/result`, {
+      validateStatus: () => true
+    });
+
+    if (response.status === 200) {
+      return response.data;
+    }
+    if (response.status !== 202) {
+      throw new Error((response.data && response.data.error) || `Job ${jobId} failed`);
+    }
+
+    await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+  }
+};
+
 // File upload endpoint
 app.post('/api/process-audio', upload.single('file'), async (req, res) => {
   try {
@@ -123,25 +143,22 @@ app.post('/api/process-audio', upload.single('file'), async (req, res) => {
       mimetype: req.file.mimetype
     });
 
-    // Use axios to send the file to Flask
+    // Use axios to hand the file to Flask
     const axios = require('axios');
-    const FormData = require('form-data');
-    const fs = require('fs');
 
     try {
-      // Create a FormData object
-      const form = new FormData();
-      form.append('file', fs.createReadStream(req.file.path));
-
-      // Send the file to Flask for processing
-      const flaskResponse = await axios.post('http://localhost:5000/process-audio', form, {
-        headers: {
-          ...form.getHeaders(),
-        },
+      // Flask reads the upload from the shared uploads directory, so the
+      // file is referenced by path instead of being copied a second time
+      const submitResponse = await axios.post('http://localhost:5000/jobs', {
+        file_path: req.file.path
       });
 
-      console.log('Flask response:', flaskResponse.data);
-      const pythonResponse = flaskResponse.data;
+      const jobId = submitResponse.data.data.job_id;
+      console.log('Flask job queued:', jobId);
+
+      // Poll for the result instead of holding one long request open
+      const pythonResponse = await waitForJobResult(axios, jobId);
+      console.log('Flask response:', pythonResponse);
 
       if (pythonResponse.status === 'error') {
         throw new Error(pythonResponse.error || 'Python processing failed');